@@ -1,136 +1,220 @@
+import copy
+import functools
+import hmac
+import json
+import logging
+import threading
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, ctx, ClientsideFunction, Input, Output, State, MATCH
+from dash.exceptions import PreventUpdate
+from flask import jsonify, request
 import pandas as pd
 import plotly.graph_objs as go
-import plotly.express as px
-from scipy.stats import linregress
+import export
+import metrics
+import settings
+from backends import DuckDBBackend, PandasBackend, PartitionedBackend
+from data_cache import load_sales_data, remove_stale_entries
+from dataset import SalesDataset
+from figure_cache import FigureCache
+from figure_registry import FigureRegistry
+from partitions import load_partitions
+from payload import compress_responses
+from plotly.io.json import to_json_plotly
+from prerender import LayoutSnapshot, layout_key
+from reloader import FileWatcher
+from sales_cube import DIMENSIONS
+from schema import SCHEMA, STATE_ABBREV as state_abbrev
+from sketches import SKETCH_DIMENSIONS, SKETCH_MEASURES
+
+logger = logging.getLogger(__name__)
 
-df = pd.read_csv(r"D:\Projects\Dashboard\SuperSalesStore\cleanSalesData.csv")
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
 
-total_sales = df['Sales'].sum()
 
-fig_totalSalesIndicator = go.Figure(go.Indicator(
-    mode="gauge+number",
-    value=total_sales,
-    number={
-        'valueformat': ',.0f',
-        'font': {'size': 25}  # Adjust text size in the middle
-    },
-    gauge={
-        'axis': {'range': [0, 2.5e6]},  # Set range of the gauge
-        'bar': {'color': '#0052ef'},  # Set bar color to your shade of blue
-        'steps': [],  # Remove background bands
-        'threshold': None  # Remove the red threshold line
-    },
-    domain={'x': [0, 1], 'y': [0, 1]}
-))
+def open_backend():
+    # Returns (dataset, backend); dataset is None when nothing is held in memory
+    if settings.BACKEND == 'duckdb':
+        # Queried in place with SQL, nothing is loaded; /api/ingest is disabled
+        return None, DuckDBBackend(settings.DUCKDB_SOURCE)
+    if settings.BACKEND == 'partitioned':
+        # Split by Region/Category once, then read part by part; /api/ingest is disabled
+        return None, PartitionedBackend(load_partitions(settings.DATA_PATH, settings.PARTITIONS_DIR))
 
-fig_totalSalesIndicator.update_layout(
-    title="Total Sales",
-    height=400,  # Adjust height as needed
-    margin=dict(l=50, r=50, t=50, b=50)
-)
+    # Parsed once into a columnar cache, then memory-mapped on every later start
+    df = load_sales_data(settings.DATA_PATH, settings.CACHE_DIR)
 
+    # The dataset also holds the sum/count of every measure for each combination of
+    # dimensions (dataset.cube). The charts below roll that up instead of grouping
+    # the raw rows again, and new rows sent to /api/ingest are added to it by delta.
+    dataset = SalesDataset(df, version=df.attrs['version'])
+    return dataset, PandasBackend(dataset)
 
-total_profit = df['Profit'].sum()
 
+# Every chart gets its numbers from `backend` (see backends.py). Both are
+# replaced together by reload_data() when the data file changes.
+dataset, backend = open_backend()
 
-fig_total_profitIndicator = go.Figure(go.Indicator(
-    mode="gauge+number",
-    value=total_profit,  # Current value (total profit)
-      number={
-        'prefix': "$", 
-        'valueformat': ',.0f',
-        'font': {'size': 25}  # Adjust text size in the middle
-    },
-    gauge={
-        'axis': {
-            'range': [0, 750000],  # Set range of the gauge from 0 to 750k
-            'tickvals': [0, 250000, 500000, 750000],  # Define tick positions at 0, 250k, 500k, and 750k
-            'ticktext': ['$0', '$250k', '$500k', '$750k'],  # Add labels for tick positions
+# Number of times the data was reloaded since startup
+data_generation = 0
+
+# Callback figures only depend on their inputs and the data, so they are cached
+figure_cache = FigureCache(maxsize=settings.FIGURE_CACHE_SIZE)
+
+# The static charts are only built the first time a browser asks for them
+figures = FigureRegistry(version=lambda: backend.version)
+
+
+def rollup(dim, measures, selection=None, count=False):
+    return backend.rollup([dim], measures, count=count, where=selection)
+
+
+def total(measure, selection=None):
+    return backend.totals([] if measure == 'Count' else [measure], where=selection)[measure]
+
+
+def value_counts(dim, selection=None):
+    return backend.value_counts(dim, where=selection)
+
+
+@figures.register('total-sales-gauge', cross_filtered=True)
+def build_total_sales_gauge(selection=None):
+    total_sales = total('Sales', selection)
+
+    fig_totalSalesIndicator = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=total_sales,
+        number={
+            'valueformat': ',.0f',
+            'font': {'size': 25}  # Adjust text size in the middle
         },
-        'bar': {'color': "#594bf2"},  
-        'steps': [],  # Remove background color bands
-        'threshold': None  # Remove the red threshold line
-    },
-    domain={'x': [0, 1], 'y': [0, 1]}
-))
+        gauge={
+            'axis': {'range': [0, 2.5e6]},  # Set range of the gauge
+            'bar': {'color': '#0052ef'},  # Set bar color to your shade of blue
+            'steps': [],  # Remove background bands
+            'threshold': None  # Remove the red threshold line
+        },
+        domain={'x': [0, 1], 'y': [0, 1]}
+    ))
 
-fig_total_profitIndicator.update_layout(
-    title="Total Profit",
-    height=400,  # Adjust height as needed
-    margin=dict(l=50, r=50, t=50, b=50)  # Optional: Adjust margins to center the indicator card
-)
+    fig_totalSalesIndicator.update_layout(
+        title="Total Sales",
+        height=400,  # Adjust height as needed
+        margin=dict(l=50, r=50, t=50, b=50)
+    )
+    return fig_totalSalesIndicator
 
 
+@figures.register('total-profit-gauge', cross_filtered=True)
+def build_total_profit_gauge(selection=None):
+    total_profit = total('Profit', selection)
 
 
+    fig_total_profitIndicator = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=total_profit,  # Current value (total profit)
+          number={
+            'prefix': "$", 
+            'valueformat': ',.0f',
+            'font': {'size': 25}  # Adjust text size in the middle
+        },
+        gauge={
+            'axis': {
+                'range': [0, 750000],  # Set range of the gauge from 0 to 750k
+                'tickvals': [0, 250000, 500000, 750000],  # Define tick positions at 0, 250k, 500k, and 750k
+                'ticktext': ['$0', '$250k', '$500k', '$750k'],  # Add labels for tick positions
+            },
+            'bar': {'color': "#594bf2"},  
+            'steps': [],  # Remove background color bands
+            'threshold': None  # Remove the red threshold line
+        },
+        domain={'x': [0, 1], 'y': [0, 1]}
+    ))
 
-total_quantity = df['Quantity'].sum()
+    fig_total_profitIndicator.update_layout(
+        title="Total Profit",
+        height=400,  # Adjust height as needed
+        margin=dict(l=50, r=50, t=50, b=50)  # Optional: Adjust margins to center the indicator card
+    )
+    return fig_total_profitIndicator
 
 
-fig_total_quantityIndicator = go.Figure(go.Indicator(
-    mode="number",
-    value=total_quantity,  
-    number={'valueformat': ',.0f'}, 
-    domain={'x': [0, 1], 'y': [0, 1]}
-))
 
 
-fig_total_quantityIndicator.update_layout(
-    paper_bgcolor="lightgray",
-    title="Total Quantity",
-    height=150, 
-    width=250,   
-    margin=dict(t=40, b=40, l=40, r=40) 
 
-    
-)
+@figures.register('total-quantity-card', cross_filtered=True)
+def build_total_quantity_card(selection=None):
+    total_quantity = total('Quantity', selection)
 
 
+    fig_total_quantityIndicator = go.Figure(go.Indicator(
+        mode="number",
+        value=total_quantity,  
+        number={'valueformat': ',.0f'}, 
+        domain={'x': [0, 1], 'y': [0, 1]}
+    ))
 
 
+    fig_total_quantityIndicator.update_layout(
+        paper_bgcolor="lightgray",
+        title="Total Quantity",
+        height=150, 
+        width=250,   
+        margin=dict(t=40, b=40, l=40, r=40) 
 
 
+    )
+    return fig_total_quantityIndicator
 
 
-total_customers = df['Type_of_customer'].count()
 
-fig_TypeOfCustomers = {
-    'data': [
-        go.Pie(
-            labels=df['Type_of_customer'].unique(),
-            values=df['Type_of_customer'].value_counts(),
-            textinfo='label',  
-            textposition='outside',  # Position the text outside of the graph
-            hole=0.5, 
-            opacity=0.9,
-            marker=dict(
-                colors=[
-                    '#28b8ff',  
-                    '#0052ef',  
-                    '#5462ff'
-                ]
-            ),
-            outsidetextfont={'size': 16, 'color': '#222222'}  # Larger and darker text outside the pie
-            
+
+
+
+
+
+@figures.register('customer-types', cross_filtered=True)
+def build_customer_types(selection=None):
+    total_customers = total('Count', selection)
+    customer_counts = value_counts('Type_of_customer', selection)
+
+    fig_TypeOfCustomers = {
+        'data': [
+            go.Pie(
+                labels=customer_counts['Type_of_customer'],
+                values=customer_counts['Count'],
+                textinfo='label',  
+                textposition='outside',  # Position the text outside of the graph
+                hole=0.5, 
+                opacity=0.9,
+                marker=dict(
+                    colors=[
+                        '#28b8ff',  
+                        '#0052ef',  
+                        '#5462ff'
+                    ]
+                ),
+                outsidetextfont={'size': 16, 'color': '#222222'}  # Larger and darker text outside the pie
+
+            )
+        ],
+        'layout': go.Layout(
+            title='Distribution of Customer Types',
+            showlegend=False,
+            hovermode='closest',
+            annotations=[  
+                {
+                    'text': f'total: {total_customers}',
+                    'x': 0.5,
+                    'y': 0.5,
+                    'font': {'size': 18, 'color': '#222222'},
+                    'showarrow': False
+                }
+            ]
         )
-    ],
-    'layout': go.Layout(
-        title='Distribution of Customer Types',
-        showlegend=False,
-        hovermode='closest',
-        annotations=[  
-            {
-                'text': f'total: {total_customers}',
-                'x': 0.5,
-                'y': 0.5,
-                'font': {'size': 18, 'color': '#222222'},
-                'showarrow': False
-            }
-        ]
-    )
-}
+    }
+    return fig_TypeOfCustomers
 
 
 
@@ -138,75 +222,69 @@ fig_TypeOfCustomers = {
 
 
 
-ship_mode_counts = df['Ship Mode'].value_counts().reset_index()
-ship_mode_counts.columns = ['Ship Mode', 'Count']
+@figures.register('ship-modes', cross_filtered=True)
+def build_ship_modes(selection=None):
+    ship_mode_counts = value_counts('Ship Mode', selection)
 
 
-fig_ShipModeTreemap = go.Figure(
-    data=[go.Treemap(
-        labels=ship_mode_counts['Ship Mode'], 
-        parents=[''] * len(ship_mode_counts),  # Root has no parent
-        root_color="lightgrey",
-        values=ship_mode_counts['Count'],  
-        textinfo='label+value',  
-        marker=dict(
-            colors=ship_mode_counts['Count'],  
-            colorscale=[
-                [0, '#0052ef'],  # Starting color (blue)
-                [1, '#9224ff']   # Ending color (purple)
-            ],  # Custom gradient from blue to purple
-            showscale=True  # Display color scale
+    fig_ShipModeTreemap = go.Figure(
+        data=[go.Treemap(
+            labels=ship_mode_counts['Ship Mode'], 
+            parents=[''] * len(ship_mode_counts),  # Root has no parent
+            root_color="lightgrey",
+            values=ship_mode_counts['Count'],  
+            textinfo='label+value',  
+            marker=dict(
+                colors=ship_mode_counts['Count'],  
+                colorscale=[
+                    [0, '#0052ef'],  # Starting color (blue)
+                    [1, '#9224ff']   # Ending color (purple)
+                ],  # Custom gradient from blue to purple
+                showscale=True  # Display color scale
+            )
+        )],
+        layout=go.Layout(
+            title='Distribution of Ship Modes',
+            showlegend=False,
+            hovermode='closest',
+            margin=dict(t=50, b=50, l=50, r=50),
+            paper_bgcolor='white',  # Clean background
+            plot_bgcolor='white',   # Plot area background
+            font=dict(size=12),  # Font size for text
+            xaxis=dict(showgrid=False, zeroline=False),  # Hide gridlines for x-axis
+            yaxis=dict(showgrid=False, zeroline=False)   # Hide gridlines for y-axis
         )
-    )],
-    layout=go.Layout(
-        title='Distribution of Ship Modes',
-        showlegend=False,
-        hovermode='closest',
-        margin=dict(t=50, b=50, l=50, r=50),
-        paper_bgcolor='white',  # Clean background
-        plot_bgcolor='white',   # Plot area background
-        font=dict(size=12),  # Font size for text
-        xaxis=dict(showgrid=False, zeroline=False),  # Hide gridlines for x-axis
-        yaxis=dict(showgrid=False, zeroline=False)   # Hide gridlines for y-axis
     )
-)
+    return fig_ShipModeTreemap
 
 
 
 
 
 
-state_sales = df.groupby('State')['Sales'].sum().reset_index().round(0)
-state_sales = state_sales.sort_values(by='Sales', ascending=False)
+def sorted_state_sales(selection=None):
+    state_sales = rollup('State', ['Sales'], selection).round(0)
+    return state_sales.sort_values(by='Sales', ascending=False)
 
-# Map of full state names to abbreviations for the choropleth map
-state_abbrev = {
-    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
-    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'Florida': 'FL', 'Georgia': 'GA',
-    'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS',
-    'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD', 'Massachusetts': 'MA',
-    'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS', 'Missouri': 'MO', 'Montana': 'MT',
-    'Nebraska': 'NE', 'Nevada': 'NV', 'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM',
-    'New York': 'NY', 'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK',
-    'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC', 'South Dakota': 'SD',
-    'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT', 'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA',
-    'West Virginia': 'WV', 'Wisconsin': 'WI', 'Wyoming': 'WY'
-}
-df['State_Abbrev'] = df['State'].map(state_abbrev)
-
-state_sales_map = df.groupby('State_Abbrev')['Sales'].sum().reset_index().round(0)
-fig_SalesByStateMap = go.Figure(data=go.Choropleth(
-    locations=state_sales_map['State_Abbrev'],
-    z=state_sales_map['Sales'],
-    locationmode='USA-states',
-    colorscale='Blues',
-    colorbar_title="Total Sales"
-))
-
-fig_SalesByStateMap.update_layout(
-    title_text='Total Sales by State in the USA',
-    geo=dict(scope='usa')
-)
+
+@figures.register('sales-by-state-map')
+def build_sales_by_state_map():
+    state_sales = sorted_state_sales()
+    state_sales_map = state_sales.assign(State_Abbrev=state_sales['State'].map(state_abbrev))
+    state_sales_map = state_sales_map.dropna(subset=['State_Abbrev']).sort_values(by='State_Abbrev')
+    fig_SalesByStateMap = go.Figure(data=go.Choropleth(
+        locations=state_sales_map['State_Abbrev'],
+        z=state_sales_map['Sales'],
+        locationmode='USA-states',
+        colorscale='Blues',
+        colorbar_title="Total Sales"
+    ))
+
+    fig_SalesByStateMap.update_layout(
+        title_text='Total Sales by State in the USA',
+        geo=dict(scope='usa')
+    )
+    return fig_SalesByStateMap
 
 
 
@@ -265,11 +343,25 @@ color_map = {
 }
 
 
-fig_sun = px.sunburst(df, 
-                      path=['Region', 'State'], 
-                      color='Region',  # Color by Region
-                      color_discrete_map=color_map,  # Custom color map
-                      title="Region vs State Sunburst Chart")
+def build_region_sunburst(level='', expanded_state=None):
+    # Region -> State rings come straight from the cube, so the figure has one
+    # node per region/state whatever the number of orders
+    ids, labels, parents, values = backend.sunburst_nodes(['Region', 'State'])
+    if expanded_state is not None:
+        # City leaves are only added for the state the user clicked into
+        cities = backend.sunburst_nodes(['Region', 'State', 'City'], where={'State': [expanded_state]}, start_depth=3)
+        ids, labels, parents, values = (nodes + city_nodes for nodes, city_nodes in zip((ids, labels, parents, values), cities))
+    fig_sun = go.Figure(go.Sunburst(
+        ids=ids,
+        labels=labels,
+        parents=parents,
+        values=values,
+        branchvalues='total',
+        level=level,  # Node the chart is zoomed into ('' = whole chart)
+        marker=dict(colors=[color_map[node.split('/')[0]] for node in ids])  # Color by Region
+    ))
+    fig_sun.update_layout(title="Region vs State Sunburst Chart")
+    return fig_sun
 
 
 
@@ -313,26 +405,43 @@ fig_sun = px.sunburst(df,
 
 
 
-fig_discount = px.scatter(
-    df,
-    x='Discount',
-    y='Sales',
-    title='Correlation Between Discount and Sales',
-    labels={'Discount': 'Discount (%)', 'Sales': 'Sales '},
-    template='plotly_white'
-)
+def discount_trace(measure, selection=None):
+    if settings.SCATTER_MODE == 'density':
+        # Count the rows in each (Discount, measure) cell on the server, so the
+        # browser gets a fixed size grid however many rows there are
+        x, y, counts = backend.discount_density(measure, settings.DENSITY_BINS, where=selection)
+        return go.Heatmap(
+            x=x, y=y, z=counts,
+            colorscale=[[0, '#9cc3ff'], [1, 'blue']],
+            hoverongaps=False,  # Empty cells stay blank
+            hovertemplate='Discount: %{x:.2f}<br>' + measure + ': %{y:,.0f}<br>Rows: %{z}<extra></extra>',
+            colorbar=dict(title='Rows')
+        )
 
-# Add customization
-fig_discount .update_traces(marker=dict(size=10, color='blue', opacity=0.7))
-fig_discount .update_layout(
-    xaxis=dict(title='Discount (%)'),
-    yaxis=dict(title='Sales '),
-    title=dict(x=0.5),  # Center the title
-    margin=dict(l=20, r=20, t=40, b=20)  # Adjust margins
-)
+    # Raw points: WebGL markers for at most SCATTER_POINT_BUDGET sampled rows
+    discount, values = backend.discount_sample(measure, settings.SCATTER_POINT_BUDGET, where=selection)
+    return go.Scattergl(
+        # Discount is stored as float32; widen it back so hover labels read 0.2, not 0.2000000030
+        x=discount.astype('float64').round(2),
+        y=values,
+        mode='markers',
+        marker=dict(size=10, color='blue', opacity=0.7)
+    )
 
 
+@figures.register('discount-vs-sales', cross_filtered=True)
+def build_discount_vs_sales(selection=None):
+    fig_discount = go.Figure(discount_trace('Sales', selection))
 
+    # Add customization
+    fig_discount .update_layout(
+        template='plotly_white',
+        xaxis=dict(title='Discount (%)'),
+        yaxis=dict(title='Sales '),
+        title=dict(text='Correlation Between Discount and Sales', x=0.5),  # Center the title
+        margin=dict(l=20, r=20, t=40, b=20)  # Adjust margins
+    )
+    return fig_discount
 
 
 
@@ -350,26 +459,22 @@ fig_discount .update_layout(
 
 
 
-fig_discount_quantity = px.scatter(
-    df,
-    x='Discount',
-    y='Quantity',
-    title='Correlation Between Discount and Quantity',
-    labels={'Discount': 'Discount (%)', 'Quantity': 'Quantity '},
-    template='plotly_white'
-)
 
-# Add customization
-fig_discount_quantity .update_traces(marker=dict(size=10, color='blue', opacity=0.7))
-fig_discount_quantity .update_layout(
-    xaxis=dict(title='Discount (%)'),
-    yaxis=dict(title='Quantity '),
-    title=dict(x=0.5),  # Center the title
-    margin=dict(l=20, r=20, t=40, b=20)  # Adjust margins
-)
 
 
+@figures.register('discount-vs-quantity', cross_filtered=True)
+def build_discount_vs_quantity(selection=None):
+    fig_discount_quantity = go.Figure(discount_trace('Quantity', selection))
 
+    # Add customization
+    fig_discount_quantity .update_layout(
+        template='plotly_white',
+        xaxis=dict(title='Discount (%)'),
+        yaxis=dict(title='Quantity '),
+        title=dict(text='Correlation Between Discount and Quantity', x=0.5),  # Center the title
+        margin=dict(l=20, r=20, t=40, b=20)  # Adjust margins
+    )
+    return fig_discount_quantity
 
 
 
@@ -400,43 +505,49 @@ fig_discount_quantity .update_layout(
 
 
 
-# Aggregate the data: we’ll count the number of products (entries) per state as a proxy for number of stores
-global_sales = df.groupby('State').agg(
-    total_sales=('Sales', 'sum'),
-    total_entries=('Sales', 'count')  # Number of entries per state (or "stores")
-).reset_index()
 
-# Perform linear regression (find the trend line between number of entries and total sales)
-slope, intercept, r_value, p_value, std_err = linregress(global_sales['total_entries'], global_sales['total_sales'])
 
-# Create a trend line (y = mx + b)
-trend_line = slope * global_sales['total_entries'] + intercept
-fig_trend = {
-       'data': [
-        # Scatter plot: Number of entries vs Total Sales
-        go.Scatter(
-            x=global_sales['total_entries'],
-            y=global_sales['total_sales'],
-            mode='markers',
-            name='Sales vs. Number of Entries (Stores)',
-            marker=dict(color='blue', size=10, opacity=0.7)
-        ),
-        # Trend line
-        go.Scatter(
-            x=global_sales['total_entries'],
-            y=trend_line,
-            mode='lines',
-            name='Trend Line',
-            line=dict(color='red', width=2, dash='dash')
-        )
-    ],
-    'layout': go.Layout(
-        title='Correlation Between Number of Stores and Total Sales',
-        xaxis=dict(title='Number of Entries (Stores)'),
-        yaxis=dict(title='Total Sales'),
-        showlegend=True
+
+@figures.register('stores-vs-sales-trend', cross_filtered=True)
+def build_stores_vs_sales_trend(selection=None):
+    # Aggregate the data: we’ll count the number of products (entries) per state as a proxy for number of stores
+    global_sales = rollup('State', ['Sales'], selection, count=True).rename(
+        columns={'Sales': 'total_sales', 'Count': 'total_entries'}  # Count = number of entries per state (or "stores")
     )
-}
+
+    # Linear regression over those points (find the trend line between number of entries and total sales)
+    slope, intercept, r_value, std_err, _ = backend.state_trend(where=selection).result()
+
+    # Create a trend line (y = mx + b)
+    trend_line = slope * global_sales['total_entries'] + intercept
+    fig_trend = {
+           'data': [
+            # Scatter plot: Number of entries vs Total Sales
+            go.Scatter(
+                x=global_sales['total_entries'],
+                y=global_sales['total_sales'].round(0),  # rounded like state_sales
+                mode='markers',
+                name='Sales vs. Number of Entries (Stores)',
+                marker=dict(color='blue', size=10, opacity=0.7)
+            ),
+            # Trend line
+            go.Scatter(
+                x=global_sales['total_entries'],
+                y=trend_line.round(0),
+                mode='lines',
+                name='Trend Line',
+                line=dict(color='red', width=2, dash='dash')
+            )
+        ],
+        'layout': go.Layout(
+            title='Correlation Between Number of Stores and Total Sales',
+            xaxis=dict(title='Number of Entries (Stores)'),
+            yaxis=dict(title='Total Sales'),
+            showlegend=True
+        )
+    }
+    return fig_trend
+
 
 
 
@@ -504,9 +615,29 @@ fig_trend = {
 
 
 
+
+def lazy_graph(name, **kwargs):
+    # Graph whose figure is filled in by load_lazy_figure once the page is up
+    return dcc.Graph(id={'type': 'lazy-figure', 'name': name}, **kwargs)
 
 
 app = dash.Dash(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def metric_outputs():
+    # The outputs /metrics keeps a series for: every registered callback's,
+    # and each registered lazy figure's (asked for once all are registered)
+    lazy = {json.dumps({'name': name, 'type': 'lazy-figure'}, sort_keys=True, separators=(',', ':')) + '.figure'
+            for name in figures.names}
+    return frozenset(app.callback_map) | lazy
+
+
+# /metrics: callback and figure build timings (first, so it sees compressed sizes)
+metrics.install(app.server, figure_cache, outputs=metric_outputs)
+
+if settings.COMPRESS_RESPONSES:
+    compress_responses(app.server)
 # Updated Dash App Layout
 app.layout = html.Div(className='main-container',
     style={
@@ -525,6 +656,16 @@ app.layout = html.Div(className='main-container',
             'color': '#2c3e50'
         }),
 
+        # Cross-filter: clicking a state on the map or a node of the sunburst
+        # filters the other charts; the selection lives in this store
+        dcc.Store(id='cross-filter', data={}),
+        # Aggregates behind the two bar charts, filled in clientside mode only
+        dcc.Store(id='chart-data'),
+        html.Div([
+            html.Span(id='cross-filter-summary', style={'marginRight': '20px'}),
+            html.Button('Clear filters', id='clear-filters', n_clicks=0)
+        ], style={'textAlign': 'center', 'marginBottom': '20px'}),
+
         # Graphs Section: Total Sales Gauge, Total Profit Gauge, Top 10 States
         html.Div([
             # RadioButtons placed above the chart with a seamless background
@@ -561,7 +702,7 @@ app.layout = html.Div(className='main-container',
 
             # Total Sales Gauge
          html.Div(
-             dcc.Graph(figure=fig_totalSalesIndicator), className='gauge-graph',
+             lazy_graph('total-sales-gauge'), className='gauge-graph',
              style={
              'borderRadius': '10px',  
             'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',  
@@ -572,8 +713,8 @@ app.layout = html.Div(className='main-container',
     }
 ), html.Div(
             # Total Profit Gauge
-            dcc.Graph(
-                figure=fig_total_profitIndicator, className='gauge-graph',
+            lazy_graph(
+                'total-profit-gauge', className='gauge-graph',
                  style={
               'borderRadius': '10px',  
               'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 
@@ -669,14 +810,14 @@ dcc.Graph(
 html.Div([
     # Container for the two graphs with margin-top
     html.Div([
-      html.Div(  dcc.Graph(figure=fig_TypeOfCustomers ,className='graph', style={
+      html.Div(  lazy_graph('customer-types', className='graph', style={
               'borderRadius': '10px',  
               'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',  
               'margin': '5px',
             'overflow': 'hidden',  
               'backgroundColor': 'white'} 
             ),),
-       html.Div( dcc.Graph(figure=fig_ShipModeTreemap, className='graph',style={
+       html.Div( lazy_graph('ship-modes', className='graph',style={
               'borderRadius': '10px', 
               'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 
               'margin': '5px',
@@ -692,14 +833,14 @@ html.Div([
 ])
 
     , html.Div([
-       html.Div( dcc.Graph(figure=fig_SalesByStateMap, className='graph',style={
+       html.Div( lazy_graph('sales-by-state-map', className='graph',style={
               'borderRadius': '10px',  
               'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 
               'margin': '5px',
             'overflow': 'hidden',  
               'backgroundColor': 'white'}
             ),),
-        html.Div([ dcc.Graph(figure=fig_sun, style={
+        html.Div([ dcc.Graph(id='region-sunburst', style={
               'borderRadius': '10px', 
               'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 
               'margin': '5px',
@@ -717,8 +858,8 @@ html.Div([
     # Container for two scatter plots
     html.Div([
         # First scatter plot
-        dcc.Graph(
-            figure=fig_discount,className='graph',
+        lazy_graph(
+            'discount-vs-sales',className='graph',
             style={
                 'borderRadius': '10px', 
                 'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
@@ -729,8 +870,8 @@ html.Div([
             }
         ),
         # Second scatter plot
-        dcc.Graph(
-            figure=fig_discount_quantity,
+        lazy_graph(
+            'discount-vs-quantity',
             style={
                 'borderRadius': '10px',  
                 'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 
@@ -750,8 +891,8 @@ html.Div([
 
     # Container for the third plot below
     html.Div([
-        dcc.Graph(
-            figure=fig_trend,
+        lazy_graph(
+            'stores-vs-sales-trend',
             style={
                 'borderRadius': '10px', 
                 'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)', 
@@ -763,9 +904,44 @@ html.Div([
     ],className='scatter-plot-container',
     style={
         'marginTop': '30px'  # Add margin above the third plot
+    }),
+
+    # Distribution of a measure per dimension value, from the quantile sketches
+    html.Div([
+        html.Div([
+            dcc.Dropdown(
+                id='distribution-measure', className='dropdown',
+                options=[{'label': measure, 'value': measure} for measure in SKETCH_MEASURES],
+                value='Sales',
+                clearable=False,
+                style={'width': '50%', 'textAlign': 'center'}
+            ),
+            dcc.Dropdown(
+                id='distribution-dimension', className='dropdown',
+                options=[{'label': dim, 'value': dim} for dim in SKETCH_DIMENSIONS],
+                value='Category',
+                clearable=False,
+                style={'width': '50%', 'textAlign': 'center'}
+            )
+        ], style={
+            'display': 'flex',
+            'gap': '10px',
+            'marginBottom': '20px'
+        }),
+        dcc.Graph(id='distribution')
+    ], style={
+        'backgroundColor': '#ffffff',
+        'borderRadius': '10px',
+        'boxShadow': '0 4px 8px rgba(0, 0, 0, 0.1)',
+        'padding': '10px',
+        'marginTop': '30px'
     })])
 ])
 
+# The registered figures the page shows: only these are built up front
+page_figures = [component.id['name'] for component in app.layout._traverse()
+                if isinstance(getattr(component, 'id', None), dict) and component.id.get('type') == 'lazy-figure']
+
 
 
 
@@ -824,12 +1000,9 @@ html.Div([
 
 color_scale = [[0, '#8b69ff'], [1, '#0057ff']]  # Custom gradient from purple to blue
 
-
-@app.callback(
-    Output('sales-by-state', 'figure'),
-    Input('top-bottom-selector', 'value')
-)
-def update_sales_by_state(selected_option):
+@figure_cache.cached('update_sales_by_state', version=lambda: backend.version)
+def update_sales_by_state(selected_option, selection=None):
+    state_sales = sorted_state_sales(selection)
     if selected_option == 'top':
         selected_states = state_sales.head(10)  # Get top 10 states by sales
         title = 'Top 10 States by Total Sales'
@@ -866,12 +1039,107 @@ def update_sales_by_state(selected_option):
 
 
 @app.callback(
-    Output('sales-by-category', 'figure'),
-    [Input('metric-selector', 'value'), Input('level-selector', 'value')]
+    Output({'type': 'lazy-figure', 'name': MATCH}, 'figure'),
+    Input({'type': 'lazy-figure', 'name': MATCH}, 'id'),
+    Input('cross-filter', 'data')
+)
+def load_lazy_figure(graph_id, selection):
+    # Fires once per lazy graph when the page loads; builds the figure on first use
+    name = graph_id.get('name')
+    if name not in figures.names:
+        raise PreventUpdate  # not a graph of this page, e.g. a made up id
+    if selection and figures.is_cross_filtered(name):
+        return cross_filtered_figure(name, selection)
+    return figures.get(name)
+
+
+@figure_cache.cached('cross_filtered_figure', version=lambda: backend.version)
+def cross_filtered_figure(name, selection):
+    return figures.build(name, selection)
+
+
+@figure_cache.cached('update_region_sunburst', version=lambda: backend.version)
+def region_sunburst(level, expanded_state):
+    return build_region_sunburst(level, expanded_state)
+
+
+@app.callback(
+    Output('region-sunburst', 'figure'),
+    Input('region-sunburst', 'clickData'),
+    State('region-sunburst', 'figure')
 )
-def update_figure(selected_metric, selected_level):
+def update_region_sunburst(click_data, current_figure):
+    node = clicked_sunburst_node(click_data, current_figure)
+    # Ids are Region/State/City: zooming into a state loads its cities
+    parts = node.split('/') if node else []
+    expanded_state = parts[1] if len(parts) >= 2 else None
+    return region_sunburst(node, expanded_state)
+
+
+def clicked_sunburst_node(click_data, current_figure):
+    # Id of the node the sunburst zooms to after a click ('' = whole chart)
+    if not click_data:
+        return ''
+    node = click_data['points'][0].get('id', '')
+    current_level = current_figure['data'][0].get('level', '') if current_figure else ''
+    if node == current_level:
+        # Clicking the middle of a zoomed chart goes back up one ring
+        node = node.rpartition('/')[0]
+    return node
+
+
+# Full state names by abbreviation, to turn a click on the map back into a state
+state_names = {abbrev: name for name, abbrev in state_abbrev.items()}
+
+
+@app.callback(
+    Output('cross-filter', 'data'),
+    Input({'type': 'lazy-figure', 'name': 'sales-by-state-map'}, 'clickData'),
+    Input('region-sunburst', 'clickData'),
+    Input('clear-filters', 'n_clicks'),
+    State('region-sunburst', 'figure'),
+    State('cross-filter', 'data'),
+    prevent_initial_call=True
+)
+def update_cross_filter(map_click, sunburst_click, clear_clicks, sunburst_figure, selection):
+    selection = dict(selection or {})
+    if ctx.triggered_id == 'clear-filters':
+        return {}
+
+    if ctx.triggered_id == 'region-sunburst':
+        # The sunburst selects the region/state/city it is zoomed into
+        node = clicked_sunburst_node(sunburst_click, sunburst_figure)
+        for dim in ('Region', 'State', 'City'):
+            selection.pop(dim, None)
+        for dim, value in zip(('Region', 'State', 'City'), node.split('/') if node else []):
+            selection[dim] = [value]
+        return selection
+
+    # Clicking a state on the map adds it to the selection, clicking it again removes it
+    state = state_names.get(map_click['points'][0].get('location')) if map_click else None
+    if state is not None:
+        states = set(selection.get('State', []))
+        states.symmetric_difference_update([state])
+        selection['State'] = sorted(states)
+        if not states:
+            selection.pop('State')
+    return selection
+
+
+@app.callback(
+    Output('cross-filter-summary', 'children'),
+    Input('cross-filter', 'data')
+)
+def show_cross_filter(selection):
+    if not selection:
+        return 'Showing all orders'
+    return 'Filtered by ' + '; '.join(f"{dim}: {', '.join(values)}" for dim, values in selection.items())
+
+
+@figure_cache.cached('update_figure', version=lambda: backend.version)
+def update_figure(selected_metric, selected_level, selection=None):
     # Group the data by selected level and metric, then sort it
-    data_grouped = df.groupby(selected_level)[selected_metric].sum().reset_index().round(0)
+    data_grouped = rollup(selected_level, [selected_metric], selection).round(0)
     data_grouped = data_grouped.sort_values(by=selected_metric, ascending=False)
 
     # Define a custom color scale from purple (#8b69ff) to blue (#0057ff)
@@ -901,7 +1169,334 @@ def update_figure(selected_metric, selected_level):
     return fig
 
 
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+
+
+@figure_cache.cached('distribution', version=lambda: backend.version)
+def distribution_figure(measure, dim):
+    # Boxes drawn from the sketch percentiles (whiskers at p5/p95), with p90
+    # and p99 marked; no rows are read, whatever the size of the data
+    sketches = backend.quantile_sketches()
+    values = sketches.values(dim)
+    quantiles = pd.DataFrame(
+        [sketches.quantiles(measure, QUANTILES, dim, [value]) for value in values],
+        index=values, columns=[f'p{round(q * 100)}' for q in QUANTILES],
+    ).sort_values(by='p50', ascending=False)
+    hover = f'{dim}: %{{x}}<br>%{{y:,.2f}}<extra>%{{fullData.name}}</extra>'
+    return {
+        'data': [
+            go.Box(
+                x=quantiles.index,
+                lowerfence=quantiles['p5'],
+                q1=quantiles['p25'],
+                median=quantiles['p50'],
+                q3=quantiles['p75'],
+                upperfence=quantiles['p95'],
+                name='p5 / p25 / p50 / p75 / p95',
+                marker=dict(color='#0052ef')
+            ),
+            go.Scatter(x=quantiles.index, y=quantiles['p90'], mode='markers', name='p90',
+                       marker=dict(color='#5f28fd', symbol='diamond'), hovertemplate=hover),
+            go.Scatter(x=quantiles.index, y=quantiles['p99'], mode='markers', name='p99',
+                       marker=dict(color='#ff4b4b', symbol='x'), hovertemplate=hover),
+        ],
+        'layout': go.Layout(
+            title=f'Distribution of {measure} by {dim}',
+            yaxis_title=measure,
+            xaxis_title=dim,
+            margin={'l': 40, 'r': 40, 't': 40, 'b': 40}
+        )
+    }
+
+
+app.callback(
+    Output('distribution', 'figure'),
+    Input('distribution-measure', 'value'),
+    Input('distribution-dimension', 'value')
+)(distribution_figure)
+
+
+@figure_cache.cached('chart_data', version=lambda: backend.version)
+def chart_data(selection):
+    # Everything the clientside versions of update_sales_by_state and
+    # update_figure need, rounded and sorted the same way
+    state_sales = sorted_state_sales(selection)
+    levels = {}
+    for level in ('Category', 'Sub-Category'):
+        grouped = rollup(level, ['Sales', 'Profit', 'Quantity'], selection).round(0)
+        levels[level] = {column: grouped[column].tolist() for column in grouped.columns}
+    return {
+        'state_sales': {'State': state_sales['State'].tolist(), 'Sales': state_sales['Sales'].tolist()},
+        'levels': levels,
+    }
+
+
+if settings.CALLBACK_MODE == 'clientside':
+    # The server only sends the aggregates when the cross-filter changes;
+    # switching top/bottom, metric or level is redrawn in the browser
+    # (assets/clientside.js) without a request
+    app.callback(Output('chart-data', 'data'), Input('cross-filter', 'data'))(chart_data)
+    app.clientside_callback(
+        ClientsideFunction(namespace='sales', function_name='salesByState'),
+        Output('sales-by-state', 'figure'),
+        Input('top-bottom-selector', 'value'),
+        Input('chart-data', 'data')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='sales', function_name='salesByCategory'),
+        Output('sales-by-category', 'figure'),
+        Input('metric-selector', 'value'),
+        Input('level-selector', 'value'),
+        Input('chart-data', 'data')
+    )
+else:
+    app.callback(
+        Output('sales-by-state', 'figure'),
+        Input('top-bottom-selector', 'value'),
+        Input('cross-filter', 'data')
+    )(update_sales_by_state)
+    app.callback(
+        Output('sales-by-category', 'figure'),
+        [Input('metric-selector', 'value'), Input('level-selector', 'value'), Input('cross-filter', 'data')]
+    )(update_figure)
+
+
+@app.server.route('/api/ingest', methods=['POST'])
+def ingest_rows():
+    # New raw order rows as a JSON list of records; they are cleaned and
+    # validated like a loaded file and added to the aggregates without
+    # reloading the CSV. Rows failing validation are left out and listed
+    # (by position in the list) with the checks they failed
+    token = settings.INGEST_TOKEN
+    if dataset is None:
+        return jsonify(error=f'Ingestion is not supported by the {settings.BACKEND} backend'), 409
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        return jsonify(error='Ingestion is disabled or the token is wrong'), 403
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        return jsonify(error='Expected a JSON list of rows'), 400
+    try:
+        added, quarantined = dataset.append(pd.DataFrame.from_records(records))
+    except (KeyError, ValueError, TypeError) as error:
+        return jsonify(error=f'Invalid rows: {error}'), 400
+    rejected = [{'row': int(row), 'failed_checks': checks}
+                for row, checks in quarantined['failed_checks'].items()]
+    return jsonify(added=added, duplicates=len(records) - added - len(rejected),
+                   quarantined=len(rejected), rejected=rejected, version=dataset.version)
+
+
+# Aggregates behind the charts for /api/export/<chart>: (dimensions, measures);
+# every export also gets the row Count
+EXPORT_VIEWS = {
+    'sales-by-state': (['State'], ['Sales']),
+    'sales-by-category': (['Sub-Category'], ['Sales', 'Profit', 'Quantity']),
+    'customer-types': (['Type_of_customer'], []),
+    'ship-modes': (['Ship Mode'], []),
+    'region-sunburst': (['Region', 'State'], []),
+    'stores-vs-sales-trend': (['State'], ['Sales']),
+}
+
+
+@app.server.route('/api/export/<view>')
+def export_view(view):
+    # The numbers behind a chart (`by` replaces its dimensions, e.g.
+    # by=Category), or view 'rows' for the rows themselves (`columns` picks
+    # some), as CSV or Parquet (`format`). Repeat a dimension to filter on it:
+    # ?Region=West&Region=East&Category=Technology
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify(error=f"format must be one of {', '.join(export.FORMATS)}"), 400
+    if fmt == 'parquet' and export.pq is None:
+        return jsonify(error='Parquet export needs pyarrow'), 501
+    selection = {dim: request.args.getlist(dim) for dim in DIMENSIONS if dim in request.args}
+    current = backend  # kept for the whole download, even if the data is reloaded meanwhile
+
+    if view == 'rows':
+        columns = request.args['columns'].split(',') if request.args.get('columns') else None
+        unknown = [column for column in columns or [] if column not in SCHEMA]
+        if unknown:
+            return jsonify(error=f"Unknown columns: {', '.join(unknown)}"), 400
+        frames = current.scan_rows(columns, where=selection)
+    elif view in EXPORT_VIEWS:
+        dims, measures = EXPORT_VIEWS[view]
+        if request.args.get('by'):
+            dims = request.args['by'].split(',')
+            unknown = [dim for dim in dims if dim not in DIMENSIONS]
+            if unknown:
+                return jsonify(error=f"Unknown dimensions: {', '.join(unknown)}"), 400
+        frames = [current.rollup(dims, measures, count=True, where=selection)]
+    else:
+        return jsonify(error=f"Unknown view {view}, expected rows or one of {', '.join(EXPORT_VIEWS)}"), 404
+    return export.stream(frames, fmt, view, current.version)
+
+
+# Set once every figure has been built, see warm_up()
+ready = threading.Event()
+# warm_up() left the work to warm_in_background()
+warm_pending = False
+
+
+def prerendered_layout():
+    # (version, layout JSON) with every output the page would otherwise fire a
+    # callback for on load filled in, for the default inputs and no cross-filter
+    version = backend.version
+    layout = copy.deepcopy(app.get_layout())
+    components = {}
+    for component in layout._traverse():
+        component_id = getattr(component, 'id', None)
+        if isinstance(component_id, dict) and component_id.get('type') == 'lazy-figure':
+            component.figure = figures.get(component_id['name'])
+        elif component_id is not None:
+            components[component_id] = component
+
+    def value(component_id):
+        return components[component_id].value
+
+    selection = components['cross-filter'].data
+    components['sales-by-state'].figure = update_sales_by_state(value('top-bottom-selector'), selection)
+    components['sales-by-category'].figure = update_figure(value('metric-selector'), value('level-selector'), selection)
+    if settings.CALLBACK_MODE == 'clientside':
+        components['chart-data'].data = chart_data(selection)
+    components['region-sunburst'].figure = region_sunburst('', None)
+    components['cross-filter-summary'].children = show_cross_filter(selection)
+    components['distribution'].figure = distribution_figure(value('distribution-measure'), value('distribution-dimension'))
+    if backend.version != version:
+        return None  # reloaded meanwhile, the figures may be from either version
+    return version, to_json_plotly(layout)
+
+
+def prerendered_dependencies():
+    # The callbacks as /_dash-dependencies lists them, but none firing on
+    # load: the snapshot already has their outputs
+    return to_json_plotly([{**callback, 'prevent_initial_call': True} for callback in app._callback_list])
+
+
+snapshot = None
+if settings.PRERENDER:
+    with open(__file__, encoding='utf-8') as source:
+        snapshot = LayoutSnapshot(
+            settings.SNAPSHOT_DIR,
+            layout_key(source.read(), to_json_plotly(app.get_layout()), settings.CALLBACK_MODE,
+                       settings.SCATTER_MODE, settings.DENSITY_BINS, settings.SCATTER_POINT_BUDGET),
+            prerendered_layout,
+            version=lambda: backend.version,
+            dependencies=prerendered_dependencies,
+        )
+    snapshot.install(app.server)
+    # Loaded here, so any process serving app.server answers with the last
+    # snapshot from its first request on, whether it runs warm_up() or not
+    snapshot.load()
+
+
+def warm_backend(new_dataset, new_backend):
+    # The backend's shared aggregates, and with /api/ingest on the row hashes
+    # its duplicate check needs (so the first batch doesn't wait for them)
+    new_backend.warm_up()
+    if new_dataset is not None and settings.INGEST_TOKEN:
+        new_dataset.prepare_append()
+
+
+def warm_up():
+    """Build every static figure and the cross-filter indexes up front.
+
+    serve.py runs this in the parent process before forking the workers, so
+    they all start with the figures built and share them copy-on-write.
+    The backend's shared aggregates go first, then the figures are built in
+    parallel from them (settings.BUILD_WORKERS, settings.BUILD_POOL).
+
+    If a layout snapshot was loaded, the page is served from it and nothing
+    is computed here: warm_in_background() does it once serving has started.
+    """
+    global warm_pending
+    if snapshot is not None and snapshot.snapshot is not None:
+        warm_pending = True
+        ready.set()
+        return
+    warm_backend(dataset, backend)
+    figures.build_all(settings.BUILD_WORKERS, settings.BUILD_POOL, names=page_figures)
+    region_sunburst('', None)
+    if snapshot is not None:
+        snapshot.rebuild()
+    ready.set()
+
+
+def warm_in_background():
+    # After a warm_up() that served a snapshot: the backend's aggregates (for
+    # the first interactions) and, if the data changed since, the snapshot
+    # are built on a thread while requests are answered. Runs in every worker,
+    # threads don't survive the fork
+    if not warm_pending:
+        return None
+
+    def warm():
+        try:
+            warm_backend(dataset, backend)
+            if not snapshot.is_current():
+                snapshot.rebuild()
+        except Exception:
+            logger.exception('Warming up behind the layout snapshot failed')
+
+    thread = threading.Thread(target=warm, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def reload_data():
+    """Load the data file again and switch every callback over to it.
+
+    Runs on the watcher thread: the new data is loaded and aggregated while
+    requests keep being answered from the old one, then both globals are
+    swapped at once. Figures are keyed by the backend's version, so nothing
+    built from the old data is served after the swap; the caches are also
+    emptied to free that memory, and the cache entries of the old file are
+    deleted. Rows added through /api/ingest since the last load are dropped,
+    the file is the source of truth.
+    """
+    global dataset, backend, data_generation
+    new_dataset, new_backend = open_backend()
+    warm_backend(new_dataset, new_backend)
+    old_version = backend.version
+    dataset, backend = new_dataset, new_backend
+    data_generation += 1
+    figures.invalidate()
+    figure_cache.clear()
+    logger.info('Data reloaded (generation %d): %s -> %s', data_generation, old_version, backend.version)
+    if dataset is not None:
+        remove_stale_entries(settings.CACHE_DIR, dataset.base_version)
+    elif settings.BACKEND == 'partitioned':
+        remove_stale_entries(settings.PARTITIONS_DIR, backend.version)
+    for name in page_figures:
+        figures.entry(name)
+    if snapshot is not None:
+        snapshot.rebuild()
+
+
+def watch_data():
+    # Polls the data file in the background, see settings.RELOAD_INTERVAL
+    if settings.RELOAD_INTERVAL <= 0:
+        return None
+    source = settings.DUCKDB_SOURCE if settings.BACKEND == 'duckdb' else settings.DATA_PATH
+    return FileWatcher(source, reload_data, settings.RELOAD_INTERVAL, settings.RELOAD_DEBOUNCE).start()
+
+
+@app.server.route('/healthz')
+def healthz():
+    # The process is up and answering requests
+    return jsonify(status='ok')
+
+
+@app.server.route('/readyz')
+def readyz():
+    # The data is loaded and the figures are built: send traffic here
+    if not ready.is_set():
+        return jsonify(status='starting'), 503
+    return jsonify(status='ready', version=backend.version, generation=data_generation, rows=total('Count'))
+
 
 if __name__ == '__main__':
+    warm_up()
+    warm_in_background()
+    watch_data()
     app.run_server(debug=False)
 
@@ -0,0 +1,59 @@
+// Clientside versions of update_sales_by_state and update_figure, used when
+// settings.CALLBACK_MODE is 'clientside'. They draw the same figures from the
+// aggregates the server put in the 'chart-data' store.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sales: {
+        salesByState: function (selectedOption, chartData) {
+            if (!chartData) {
+                return window.dash_clientside.no_update;
+            }
+            var states = chartData.state_sales.State;
+            var sales = chartData.state_sales.Sales;
+            var top = selectedOption === 'top';
+            var x = top ? states.slice(0, 10) : states.slice(-10);
+            var y = top ? sales.slice(0, 10) : sales.slice(-10);
+            return {
+                data: [{
+                    type: 'bar',
+                    x: x,
+                    y: y,
+                    width: 0.7,
+                    marker: {color: y, colorscale: [[0, '#4225f4'], [1, '#0057ff']]}
+                }],
+                layout: {
+                    title: {text: (top ? 'Top' : 'Bottom') + ' 10 States by Total Sales'},
+                    showlegend: false,
+                    hovermode: 'closest'
+                }
+            };
+        },
+
+        salesByCategory: function (selectedMetric, selectedLevel, chartData) {
+            if (!chartData) {
+                return window.dash_clientside.no_update;
+            }
+            var grouped = chartData.levels[selectedLevel];
+            var values = grouped[selectedMetric];
+            // Largest first, like sort_values(ascending=False) on the server
+            var order = values.map(function (_, i) { return i; });
+            order.sort(function (a, b) { return values[b] - values[a]; });
+            var y = order.map(function (i) { return values[i]; });
+            return {
+                data: [{
+                    type: 'bar',
+                    x: order.map(function (i) { return grouped[selectedLevel][i]; }),
+                    y: y,
+                    marker: {color: y, colorscale: [[0, '#8b69ff'], [1, '#0057ff']]}
+                }],
+                layout: {
+                    title: {text: 'Total ' + selectedMetric + ' by ' + selectedLevel},
+                    showlegend: false,
+                    hovermode: 'closest',
+                    yaxis: {title: {text: selectedMetric}},
+                    xaxis: {title: {text: selectedLevel}},
+                    margin: {l: 40, r: 40, t: 40, b: 40}
+                }
+            };
+        }
+    }
+});
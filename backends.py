@@ -0,0 +1,468 @@
+"""Where the dashboard's aggregations run.
+
+Every chart asks a backend for the same few queries: a rollup (sums and row
+counts grouped by some dimensions), grand totals, and the Discount vs
+measure density grid or point sample, each optionally restricted to a
+cross-filter selection ({dimension: [values]}).
+
+PandasBackend answers them in memory, from a SalesDataset's cube and rows.
+DuckDBBackend pushes them down as SQL to an embedded DuckDB over Parquet (or
+CSV) files, which are scanned out-of-core, so the data never has to fit in
+memory. A cleaned CSV can be turned into Parquet with DuckDB itself:
+
+    COPY (SELECT * FROM 'cleanSalesData.csv') TO 'sales.parquet' (FORMAT parquet)
+
+PartitionedBackend reads the Region/Category layout written by partitions.py
+one part at a time, skipping the parts a selection rules out and mapping only
+the columns a query uses.
+"""
+import abc
+import functools
+import glob
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from density import density_grid, grid_edges, grid_result, sample_rows
+from filter_engine import selection_key
+from metrics import phase
+from regression import RunningRegression
+from sales_cube import DIMENSIONS
+from schema import SCHEMA
+from sketches import SKETCH_DIMENSIONS, SKETCH_MEASURES, SketchSet
+
+
+class Backend(abc.ABC):
+    # Queries built on top of rollup(); subclasses implement the abstract ones
+    # and set `version` (a string that changes with the data)
+
+    @abc.abstractmethod
+    def rollup(self, dims, measures=(), count=False, where=None):
+        """Sums of `measures` (and the row Count) grouped by `dims`, one row per combination present."""
+
+    @abc.abstractmethod
+    def totals(self, measures, where=None):
+        """{measure: sum} over the rows matching `where`, plus their 'Count'."""
+
+    @abc.abstractmethod
+    def discount_density(self, measure, bins, where=None):
+        """(x_centers, y_centers, counts) of Discount vs `measure` on a bins x bins grid, like density.density_grid()."""
+
+    @abc.abstractmethod
+    def discount_sample(self, measure, budget, where=None):
+        """(discount, values) arrays of at most `budget` rows, sampled like density.sample_rows()."""
+
+    @phase('data')
+    def value_counts(self, dim, where=None):
+        counts = self.rollup([dim], [], count=True, where=where)
+        return counts.sort_values(by='Count', ascending=False, kind='stable').reset_index(drop=True)
+
+    @phase('data')
+    def sunburst_nodes(self, path, where=None, start_depth=1):
+        """ids/labels/parents/values of a sunburst over the `path` dimensions.
+
+        Values are row counts and parents are the sum of their children, so the
+        result can be drawn with branchvalues='total'. Node ids are the labels
+        along the path joined with '/'. Rings above `start_depth` are left out.
+        """
+        ids, labels, parents, values = [], [], [], []
+        for depth in range(start_depth, len(path) + 1):
+            level = self.rollup(path[:depth], [], count=True, where=where)
+            level_ids = level[path[0]].astype(str)
+            for dim in path[1:depth]:
+                level_ids = level_ids + '/' + level[dim].astype(str)
+            level_parents = level_ids.str.rsplit('/', n=1).str[0] if depth > 1 else [''] * len(level)
+            ids.extend(level_ids)
+            labels.extend(level[path[depth - 1]])
+            parents.extend(level_parents)
+            values.extend(level['Count'])
+        return ids, labels, parents, values
+
+    @phase('data')
+    def state_trend(self, by=None, where=None):
+        """RunningRegression of total Sales vs row count over the states.
+
+        With `by` (e.g. 'Region'), one per value of that dimension, over the
+        states' totals within it. Only needs a rollup, never the rows.
+        """
+        if by is None:
+            points = self.rollup(['State'], ['Sales'], count=True, where=where)
+            return RunningRegression.from_points(points['Count'], points['Sales'])
+        points = self.rollup([by, 'State'], ['Sales'], count=True, where=where)
+        return {value: RunningRegression.from_points(group['Count'], group['Sales'])
+                for value, group in points.groupby(by, sort=True)}
+
+    @abc.abstractmethod
+    def quantile_sketches(self):
+        """sketches.SketchSet of the whole data, built once per version."""
+
+    @abc.abstractmethod
+    def scan_rows(self, columns=None, where=None, chunk_rows=100_000):
+        """DataFrames of the rows matching `where` (all columns by default), at most chunk_rows each.
+
+        There is always at least one frame, empty if no row matches.
+        """
+
+    def warm_up(self):
+        self.quantile_sketches()
+
+
+class PandasBackend(Backend):
+    """Aggregates from a SalesDataset in memory, like the dashboard always did.
+
+    Rollups come from the cube; with a selection they go through the cube's
+    cross-filter engine, which computes every dimension's rollup for that
+    selection in one pass and keeps the last few selections. The Discount
+    charts read the rows.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._selection_aggregates = functools.lru_cache(maxsize=64)(self._aggregate)
+
+    @property
+    def version(self):
+        return self.dataset.version
+
+    def _aggregate(self, version, key):
+        return self.dataset.cell_filter.aggregate(dict(key), DIMENSIONS)
+
+    def selection_aggregates(self, where):
+        return self._selection_aggregates(self.dataset.version, selection_key(where))
+
+    @phase('data')
+    def rollup(self, dims, measures=(), count=False, where=None):
+        cube = self.dataset.cube
+        if not selection_key(where):
+            return cube.rollup(dims, measures, count=count)
+        if len(dims) == 1:
+            columns = list(dims) + list(measures) + (['Count'] if count else [])
+            return self.selection_aggregates(where)[1][dims[0]][columns]
+        return cube.rollup(dims, measures, count=count, where=where)
+
+    @phase('data')
+    def totals(self, measures, where=None):
+        if not selection_key(where):
+            cube = self.dataset.cube
+            totals = {measure: cube.total(measure) for measure in measures}
+            totals['Count'] = cube.total_count()
+            return totals
+        aggregates = self.selection_aggregates(where)[0]
+        return {measure: aggregates[measure] for measure in list(measures) + ['Count']}
+
+    @phase('data')
+    def state_trend(self, by=None, where=None):
+        if by is None and not selection_key(where):
+            # A copy: an append updates the running sums under the lock
+            with self.dataset.lock:
+                return self.dataset.state_trend.regression.copy()
+        return super().state_trend(by, where)
+
+    def _row_ids(self, where):
+        # Rows matching `where`, None for all; without a selection the row
+        # filter isn't needed (or built) at all
+        return self.dataset.row_filter.select(where) if selection_key(where) else None
+
+    def _discount_columns(self, measure, where):
+        rows = self.dataset.rows
+        discount, values = rows['Discount'].to_numpy(), rows[measure].to_numpy()
+        ids = self._row_ids(where)
+        if ids is not None:
+            discount, values = discount[ids], values[ids]
+        return discount, values
+
+    def scan_rows(self, columns=None, where=None, chunk_rows=100_000):
+        rows = self.dataset.rows
+        columns = list(rows.columns) if columns is None else list(columns)
+        ids = self._row_ids(where)
+        n_rows = len(rows) if ids is None else len(ids)
+        for start in range(0, max(n_rows, 1), chunk_rows):
+            if ids is None:
+                chunk = rows.iloc[start:start + chunk_rows]
+            else:
+                chunk = rows.iloc[ids[start:start + chunk_rows]]
+            yield chunk[columns].reset_index(drop=True)
+
+    @phase('data')
+    def discount_density(self, measure, bins, where=None):
+        discount, values = self._discount_columns(measure, where)
+        return density_grid(discount, values, bins, bins)
+
+    @phase('data')
+    def discount_sample(self, measure, budget, where=None):
+        discount, values = self._discount_columns(measure, where)
+        sample = sample_rows(len(discount), budget)
+        return discount[sample], values[sample]
+
+    def quantile_sketches(self):
+        return self.dataset.sketches
+
+    def warm_up(self):
+        # The dataset builds these on first use
+        self.dataset.rows
+        self.dataset.cell_filter
+        self.dataset.row_filter
+        self.dataset.sketches
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _column(name):
+    # A measure read with the dtype the pandas backend uses (schema.SCHEMA),
+    # e.g. Discount as float32, so values on a bin edge land in the same bin
+    sql_type = {'float32': 'FLOAT', 'float64': 'DOUBLE'}.get(SCHEMA[name], 'BIGINT')
+    return f'CAST({_quote(name)} AS {sql_type})'
+
+
+class DuckDBBackend(Backend):
+    """Pushes every query down to DuckDB over Parquet or CSV files.
+
+    `source` is a file or glob pattern; the files are scanned on every query
+    (DuckDB reads only the columns and row groups it needs), nothing is loaded
+    up front. The version is a hash of the files' names, sizes and mtimes.
+    """
+
+    def __init__(self, source):
+        import duckdb
+
+        self.source = source
+        self._connection = duckdb.connect(database=':memory:')
+        reader = 'read_csv_auto' if source.lower().endswith('.csv') else 'read_parquet'
+        self._relation = f"{reader}('{source.replace(chr(39), chr(39) * 2)}')"
+        self.version = self._fingerprint()
+        self._sketches = None
+        self._sketches_lock = threading.Lock()
+
+    def _fingerprint(self):
+        paths = sorted(glob.glob(self.source)) or [self.source]
+        digest = hashlib.sha1()
+        for path in paths:
+            stat = os.stat(path)
+            digest.update(f'{path}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+        stem = os.path.splitext(os.path.basename(paths[0]))[0]
+        return f'{stem}-{digest.hexdigest()[:16]}'
+
+    def _query(self, sql, params):
+        # A cursor per query: the connection is shared by the server's threads
+        with self._connection.cursor() as cursor:
+            return cursor.execute(sql, params).fetchdf()
+
+    def _where(self, where):
+        clauses, params = [], []
+        for dim, values in selection_key(where):
+            clauses.append(f"{_quote(dim)} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _sums(self, measures):
+        # Same types as the cube's sums (integer sums would come back as HUGEINT)
+        return [
+            f"SUM({_quote(m)})::{'BIGINT' if np.dtype(SCHEMA[m]).kind in 'iu' else 'DOUBLE'} AS {_quote(m)}"
+            for m in measures
+        ]
+
+    @phase('data')
+    def rollup(self, dims, measures=(), count=False, where=None):
+        columns = ', '.join(_quote(dim) for dim in dims)
+        selects = [columns] + self._sums(measures) + (['COUNT(*) AS "Count"'] if count else [])
+        where_sql, params = self._where(where)
+        result = self._query(
+            f"SELECT {', '.join(selects)} FROM {self._relation}{where_sql} GROUP BY {columns} ORDER BY {columns}",
+            params,
+        )
+        for dim in dims:
+            result[dim] = result[dim].astype(object)
+        return result
+
+    @phase('data')
+    def totals(self, measures, where=None):
+        where_sql, params = self._where(where)
+        selects = self._sums(measures) + ['COUNT(*) AS "Count"']
+        row = self._query(f"SELECT {', '.join(selects)} FROM {self._relation}{where_sql}", params).iloc[0]
+        totals = {measure: row[measure] if pd.notna(row[measure]) else 0 for measure in measures}
+        totals['Count'] = int(row['Count'])
+        return totals
+
+    @phase('data')
+    def discount_density(self, measure, bins, where=None):
+        # Same grid as density.density_grid: `bins` equal bins between the min
+        # and max of each column, the max falling in the last bin
+        where_sql, params = self._where(where)
+        x, y = _column('Discount'), _column(measure)
+        extent = self._query(
+            f'SELECT MIN({x}) AS x0, MAX({x}) AS x1, MIN({y}) AS y0, MAX({y}) AS y1 '
+            f'FROM {self._relation}{where_sql}', params).iloc[0]
+        x_edges, y_edges = (
+            grid_edges(*((0.0, 1.0) if pd.isna(low) else (float(low), float(high))), bins)
+            for low, high in ((extent['x0'], extent['x1']), (extent['y0'], extent['y1']))
+        )
+
+        cells = self._query(
+            f'SELECT LEAST(FLOOR(({x} - ?) / ?), {bins - 1})::INTEGER AS x_bin, '
+            f'LEAST(FLOOR(({y} - ?) / ?), {bins - 1})::INTEGER AS y_bin, COUNT(*) AS n '
+            f'FROM {self._relation}{where_sql} GROUP BY x_bin, y_bin',
+            [x_edges[0], (x_edges[-1] - x_edges[0]) / bins, y_edges[0], (y_edges[-1] - y_edges[0]) / bins] + params,
+        )
+        counts = np.full((bins, bins), np.nan, dtype=np.float32)
+        counts[cells['y_bin'].to_numpy(), cells['x_bin'].to_numpy()] = cells['n'].to_numpy()
+        return (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2, counts
+
+    def scan_rows(self, columns=None, where=None, chunk_rows=100_000):
+        columns = list(SCHEMA) if columns is None else list(columns)
+        selects = [_quote(name) if SCHEMA[name] == 'category' else f'{_column(name)} AS {_quote(name)}'
+                   for name in columns]
+        where_sql, params = self._where(where)
+        with self._connection.cursor() as cursor:
+            result = cursor.execute(f"SELECT {', '.join(selects)} FROM {self._relation}{where_sql}", params)
+            # fetch_df_chunk() counts in vectors of 2048 rows
+            vectors = max(1, chunk_rows // 2048)
+            first = True
+            while True:
+                chunk = result.fetch_df_chunk(vectors)
+                if len(chunk) or first:
+                    yield chunk
+                if not len(chunk):
+                    break
+                first = False
+
+    def quantile_sketches(self):
+        # One scan of the files, a batch of rows at a time
+        with self._sketches_lock:
+            if self._sketches is None:
+                columns = [_quote(dim) for dim in SKETCH_DIMENSIONS]
+                columns += [f'{_column(measure)} AS {_quote(measure)}' for measure in SKETCH_MEASURES]
+                sketches = SketchSet()
+                with self._connection.cursor() as cursor:
+                    result = cursor.execute(f"SELECT {', '.join(columns)} FROM {self._relation}")
+                    while True:
+                        batch = result.fetch_df_chunk(64)
+                        if not len(batch):
+                            break
+                        sketches.update(batch)
+                self._sketches = sketches
+            return self._sketches
+
+    @phase('data')
+    def discount_sample(self, measure, budget, where=None):
+        where_sql, params = self._where(where)
+        sample = self._query(
+            f'SELECT {_column("Discount")} AS "Discount", {_column(measure)} AS {_quote(measure)} '
+            f'FROM (SELECT * FROM {self._relation}{where_sql}) '
+            f'USING SAMPLE reservoir({int(budget)} ROWS) REPEATABLE (0)',
+            params,
+        )
+        return sample['Discount'].to_numpy(), sample[measure].to_numpy()
+
+
+def _sum_dtype(measure):
+    return np.int64 if np.dtype(SCHEMA[measure]).kind in 'iu' else np.float64
+
+
+class PartitionedBackend(Backend):
+    """Aggregates a partitions.PartitionedDataset part by part.
+
+    Each query only opens the parts that can hold rows of the selection
+    (by their Region/Category and the value lists in the partition index),
+    maps just the columns it needs, and merges the per-part results. Nothing
+    stays in memory between queries but the index.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._sketches = None
+
+    @property
+    def version(self):
+        return self.dataset.version
+
+    def quantile_sketches(self):
+        # Merged from the sketches written with each part
+        if self._sketches is None:
+            self._sketches = self.dataset.sketches()
+        return self._sketches
+
+    def scan_rows(self, columns=None, where=None, chunk_rows=100_000):
+        # One frame per part (a part holds at most one CSV chunk of rows)
+        columns = list(SCHEMA) if columns is None else list(columns)
+        empty = True
+        for _, part in self.dataset.scan(columns, where):
+            if len(part):
+                empty = False
+                for start in range(0, len(part), chunk_rows):
+                    yield part.iloc[start:start + chunk_rows].reset_index(drop=True)
+        if empty:
+            yield pd.DataFrame({name: pd.Series(dtype=object) for name in columns})
+
+    @phase('data')
+    def rollup(self, dims, measures=(), count=False, where=None):
+        measures = list(measures)
+        pieces = []
+        for _, part in self.dataset.scan(list(dims) + measures, where):
+            grouped = part.groupby(list(dims), observed=True, sort=False)
+            piece = grouped[measures].sum() if measures else pd.DataFrame(index=grouped.size().index)
+            if count:
+                piece['Count'] = grouped.size()
+            piece = piece.reset_index()
+            for dim in dims:
+                piece[dim] = piece[dim].astype(object)
+            pieces.append(piece)
+        columns = list(dims) + measures + (['Count'] if count else [])
+        if not pieces:
+            return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+        result = pd.concat(pieces, ignore_index=True).groupby(list(dims), sort=True).sum().reset_index()
+        for measure in measures:
+            result[measure] = result[measure].astype(_sum_dtype(measure))
+        if count:
+            result['Count'] = result['Count'].astype(np.int64)
+        return result[columns]
+
+    @phase('data')
+    def totals(self, measures, where=None):
+        totals = dict.fromkeys(measures, 0)
+        totals['Count'] = 0
+        for _, part in self.dataset.scan(list(measures), where):
+            for measure in measures:
+                totals[measure] += part[measure].to_numpy().sum(dtype=_sum_dtype(measure))
+            totals['Count'] += len(part)
+        return totals
+
+    def _extent(self, column, where):
+        # Without row filtering the partition index has the exact min/max
+        if not self.dataset.needs_row_filter(where):
+            return self.dataset.stats_range(column, where)
+        low = high = None
+        for _, part in self.dataset.scan([column], where):
+            if len(part):
+                values = part[column].to_numpy()
+                low = values.min() if low is None else min(low, values.min())
+                high = values.max() if high is None else max(high, values.max())
+        return low, high
+
+    @phase('data')
+    def discount_density(self, measure, bins, where=None):
+        # Same grid as density.density_grid, counted one part at a time
+        x_edges, y_edges = (
+            grid_edges(*((0.0, 1.0) if low is None else (float(low), float(high))), bins)
+            for low, high in (self._extent('Discount', where), self._extent(measure, where))
+        )
+        counts = np.zeros((bins, bins))
+        for _, part in self.dataset.scan(['Discount', measure], where):
+            counts += np.histogram2d(
+                part['Discount'].to_numpy(dtype=np.float64), part[measure].to_numpy(dtype=np.float64),
+                bins=(x_edges, y_edges))[0]
+        return grid_result(counts, x_edges, y_edges)
+
+    @phase('data')
+    def discount_sample(self, measure, budget, where=None):
+        parts = [part for _, part in self.dataset.scan(['Discount', measure], where)]
+        if not parts:
+            return np.array([], dtype=np.float32), np.array([], dtype=SCHEMA[measure])
+        discount = np.concatenate([part['Discount'].to_numpy() for part in parts])
+        values = np.concatenate([part[measure].to_numpy() for part in parts])
+        sample = sample_rows(len(discount), budget)
+        return discount[sample], values[sample]
@@ -0,0 +1,166 @@
+"""Benchmarks for the dashboard: data loading, figure building and callbacks.
+
+    python benchmarks/bench_dashboard.py --rows 10000 1000000 10000000 --output bench.json
+
+For every size a Superstore-shaped CSV is generated from the value
+combinations in cleanSalesData.csv, then a fresh Python process loads the
+dashboard on it and times every step. Results are printed (or written) as JSON
+so two runs can be diffed.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(REPO, 'cleanSalesData.csv')
+DIMENSION_COLUMNS = ['Ship Mode', 'Type_of_customer', 'City', 'State', 'Region', 'Category', 'Sub-Category']
+
+
+def generate_data(n_rows, path, seed=0, chunk_rows=1_000_000):
+    """Write n_rows of synthetic sales rows with the columns of cleanSalesData.csv.
+
+    Dimension values are drawn from real rows, so City/State/Region and
+    Category/Sub-Category stay consistent; measures are drawn from the real
+    distributions with some noise.
+    """
+    sample = pd.read_csv(SAMPLE_CSV)
+    rng = np.random.default_rng(seed)
+    discounts = sample['Discount'].unique()
+    with open(path, 'w', newline='') as out:
+        for start in range(0, n_rows, chunk_rows):
+            n = min(chunk_rows, n_rows - start)
+            picked = sample.iloc[rng.integers(0, len(sample), n)].reset_index(drop=True)
+            chunk = picked[DIMENSION_COLUMNS].copy()
+            chunk['Sales'] = (picked['Sales'].to_numpy() * rng.lognormal(0, 0.3, n)).round(2)
+            chunk['Quantity'] = rng.integers(1, 15, n)
+            chunk['Discount'] = rng.choice(discounts, n)
+            chunk['Profit'] = (picked['Profit'].to_numpy() * rng.lognormal(0, 0.3, n)).round(4)
+            chunk.to_csv(out, header=(start == 0), index=False)
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes on Linux
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def measure(data_path, cache_dir):
+    """Time one dashboard start on data_path. Runs inside the child process."""
+    sys.path.insert(0, REPO)
+    os.environ['SALES_DATA_PATH'] = data_path
+    os.environ['SALES_CACHE_DIR'] = cache_dir
+    from plotly.io.json import to_json_plotly
+
+    from data_cache import load_sales_data
+
+    results = {}
+    _, results['read_csv_s'] = timed(pd.read_csv, data_path)
+    _, results['load_cold_cache_s'] = timed(load_sales_data, data_path, cache_dir)
+    _, results['load_warm_cache_s'] = timed(load_sales_data, data_path, cache_dir)
+
+    start = time.perf_counter()
+    import SuperSalesDashBoard as dashboard
+    results['import_dashboard_s'] = time.perf_counter() - start
+
+    results['figures'] = {}
+    for name in dashboard.page_figures:
+        entry, seconds = timed(dashboard.figures.entry, name)
+        results['figures'][name] = {'build_s': seconds, 'json_bytes': entry.nbytes}
+
+    callbacks = {
+        'update_sales_by_state': (dashboard.update_sales_by_state, [('top',), ('bottom',)]),
+        'update_figure': (dashboard.update_figure, list(itertools.product(
+            ['Sales', 'Profit', 'Quantity'], ['Category', 'Sub-Category']))),
+        # The whole chart, then zoomed into a state, which loads its cities
+        'region_sunburst': (dashboard.region_sunburst, [('', None), ('West/California', 'California')]),
+        'distribution_figure': (dashboard.distribution_figure, list(itertools.product(
+            ['Sales', 'Profit'], ['Category', 'State']))),
+    }
+    results['callbacks'] = {}
+    for name, (callback, input_sets) in callbacks.items():
+        for inputs in input_sets:
+            # __wrapped__ is the callback without the figure cache in front;
+            # callbacks that aren't cached have no cached time
+            uncached = getattr(callback, '__wrapped__', None)
+            figure, uncached_s = timed(uncached or callback, *inputs)
+            figure_json, serialize_s = timed(to_json_plotly, figure)
+            cached_s = None
+            if uncached is not None:
+                callback(*inputs)  # fill the cache
+                _, cached_s = timed(callback, *inputs)
+            results['callbacks'][f"{name}({', '.join(map(str, inputs))})"] = {
+                'uncached_s': uncached_s,
+                'serialize_s': serialize_s,
+                'cached_s': cached_s,
+                'json_bytes': len(figure_json),
+            }
+
+    results['peak_rss_bytes'] = peak_rss_bytes()
+    return results
+
+
+def run(rows, keep_data=False):
+    report = {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'runs': {},
+    }
+    for n_rows in rows:
+        workdir = tempfile.mkdtemp(prefix=f'sales-bench-{n_rows}-')
+        data_path = os.path.join(workdir, 'cleanSalesData.csv')
+        _, generate_s = timed(generate_data, n_rows, data_path)
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', data_path, os.path.join(workdir, 'cache')],
+            check=True, capture_output=True, text=True,
+        )
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        result['rows'] = n_rows
+        result['csv_bytes'] = os.path.getsize(data_path)
+        result['generate_s'] = generate_s
+        report['runs'][str(n_rows)] = result
+        if not keep_data:
+            import shutil
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000],
+                        help='data sizes to benchmark (default: 10k 1M 10M)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--keep-data', action='store_true', help="don't delete the generated data")
+    parser.add_argument('--measure', nargs=2, metavar=('DATA', 'CACHE_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # Child process: the dashboard's own logging must not end up in stdout
+        print(json.dumps(measure(*args.measure)))
+        sys.exit(0)
+
+    report = json.dumps(run(args.rows, keep_data=args.keep_data), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
@@ -0,0 +1,337 @@
+"""Load test: simulated users clicking through the dashboard at the same time.
+
+    python benchmarks/load_test.py --start --workers 2 --users 1 8 32 --duration 30
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --users 16 --output load.json
+
+Each user is a thread with its own keep-alive connection. It loads the page
+like the browser does (/, /_dash-layout, /_dash-dependencies, then every
+callback that fires on load), then keeps switching the top/bottom toggle
+and the metric and level dropdowns, firing the server callbacks that
+depend on what changed. The requests are built from /_dash-dependencies and
+the layout, so they follow the app when callbacks change.
+
+For every request kind (page requests by path, callbacks by output) the
+report has throughput, p50/p95/p99 latency and the error rate. With --start
+the app is started locally with serve.py (the SALES_* environment applies)
+and stopped at the end.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (component id, property) the simulated users change, picking another of the
+# component's options each time
+INTERACTIONS = [
+    ('top-bottom-selector', 'value'),
+    ('metric-selector', 'value'),
+    ('level-selector', 'value'),
+]
+
+
+def _id_key(component_id):
+    # Dash writes dict ids as compact JSON with sorted keys
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(',', ':'))
+    return component_id
+
+
+def _parse_id(text):
+    return json.loads(text) if text.startswith('{') else text
+
+
+def _components(node):
+    # Every component of a layout JSON tree
+    if isinstance(node, list):
+        for child in node:
+            yield from _components(child)
+    elif isinstance(node, dict) and 'props' in node:
+        yield node
+        for value in node['props'].values():
+            if isinstance(value, (dict, list)):
+                yield from _components(value)
+
+
+def _matches(pattern, component_id):
+    # Whether a concrete dict id fits a pattern id (wildcards are ["MATCH"] etc.)
+    if not isinstance(pattern, dict) or not isinstance(component_id, dict) or pattern.keys() != component_id.keys():
+        return False
+    return all(isinstance(value, list) or component_id[key] == value for key, value in pattern.items())
+
+
+def _concrete(pattern, match_id):
+    # The pattern id with its MATCH wildcards taken from match_id
+    if not isinstance(pattern, dict):
+        return pattern
+    return {key: match_id[key] if value == ['MATCH'] else value for key, value in pattern.items()}
+
+
+class Stats:
+    """Latencies and errors per request kind, shared by all the users."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+    def report(self, duration):
+        def summary(latencies, errors):
+            latencies = np.asarray(latencies)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            return {
+                'requests': len(latencies),
+                'throughput_rps': len(latencies) / duration,
+                'error_rate': errors / len(latencies),
+                'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                'mean_ms': latencies.mean() * 1000,
+            }
+
+        with self._lock:
+            per_label = {label: summary(latencies, self.errors.get(label, 0))
+                         for label, latencies in sorted(self.latencies.items())}
+            everything = [seconds for latencies in self.latencies.values() for seconds in latencies]
+            total = summary(everything, sum(self.errors.values())) if everything else None
+        return {'duration_s': duration, 'total': total, 'requests': per_label}
+
+
+class User:
+    """One simulated browser session against the app at `url`."""
+
+    def __init__(self, url, stats, think_time, rng):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.stats = stats
+        self.think_time = think_time
+        self.rng = rng
+        self.connection = None
+
+    def _request(self, method, path, label, body=None):
+        headers = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+            if response.getheader('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+        except (OSError, http.client.HTTPException):
+            self.connection = None  # reconnect next time
+            self.stats.record(label, time.perf_counter() - start, ok=False)
+            return None, None
+        # 204 is a callback raising PreventUpdate
+        ok = status in (200, 204)
+        self.stats.record(label, time.perf_counter() - start, ok)
+        return (status, data) if ok else (None, None)
+
+    def load_page(self):
+        """Fetch the page, layout and callbacks, and fire the callbacks that run on load."""
+        self._request('GET', '/', 'GET /')
+        _, layout = self._request('GET', '/_dash-layout', 'GET /_dash-layout')
+        _, dependencies = self._request('GET', '/_dash-dependencies', 'GET /_dash-dependencies')
+        if layout is None or dependencies is None:
+            return False
+        self.callbacks = [callback for callback in json.loads(dependencies)
+                          if not callback.get('clientside_function') and '..' not in callback['output']]
+        watched = {(item['id'], item['property'])
+                   for callback in self.callbacks for item in callback['inputs'] + callback.get('state', [])}
+
+        self.values = {}  # (id key, property) -> value, for the props callbacks read
+        self.options = {}
+        self.ids = []
+        for component in _components(json.loads(layout)):
+            props = component['props']
+            if 'id' not in props:
+                continue
+            key = _id_key(props['id'])
+            self.ids.append(props['id'])
+            for prop, value in props.items():
+                if (key, prop) in watched or prop == 'id':
+                    self.values[(key, prop)] = value
+            if 'options' in props:
+                self.options[key] = [option['value'] if isinstance(option, dict) else option
+                                     for option in props['options']]
+        self._watched = watched
+
+        for callback in self.callbacks:
+            if not callback.get('prevent_initial_call'):
+                for match_id in self._match_ids(callback):
+                    self._fire(callback, match_id, changed=[])
+        return True
+
+    def _match_ids(self, callback):
+        # Concrete ids a (maybe pattern-matching) callback runs for
+        pattern = _parse_id(callback['output'].rsplit('.', 1)[0])
+        if not isinstance(pattern, dict) or not any(isinstance(v, list) for v in pattern.values()):
+            return [None]
+        return [component_id for component_id in self.ids if _matches(pattern, component_id)]
+
+    def _fire(self, callback, match_id, changed):
+        output_id, output_prop = callback['output'].rsplit('.', 1)
+        output_id = _concrete(_parse_id(output_id), match_id)
+
+        def resolve(items):
+            resolved = []
+            for item in items:
+                component_id = _concrete(_parse_id(item['id']), match_id)
+                resolved.append({'id': component_id, 'property': item['property'],
+                                 'value': self.values.get((_id_key(component_id), item['property']))})
+            return resolved
+
+        body = {
+            'output': callback['output'],
+            'outputs': {'id': output_id, 'property': output_prop},
+            'inputs': resolve(callback['inputs']),
+            'state': resolve(callback.get('state', [])),
+            'changedPropIds': changed,
+        }
+        label = f'{_id_key(output_id)}.{output_prop}'
+        status, data = self._request('POST', '/_dash-update-component', label, body)
+        if status != 200:
+            return []
+        updated = []
+        for key, props in json.loads(data).get('response', {}).items():
+            key = _id_key(_parse_id(key))
+            for prop, value in props.items():
+                if (key, prop) in self._watched:
+                    self.values[(key, prop)] = value
+                updated.append((key, prop))
+        return updated
+
+    def change(self, component_id, prop, value):
+        """Set a prop like the user would and fire the callbacks that follow from it."""
+        self.values[(component_id, prop)] = value
+        pending = [(component_id, prop)]
+        while pending:
+            changed = pending.pop(0)
+            for callback in self.callbacks:
+                for match_id in self._match_ids(callback):
+                    inputs = [(_id_key(_concrete(_parse_id(item['id']), match_id)), item['property'])
+                              for item in callback['inputs']]
+                    if changed in inputs:
+                        pending.extend(self._fire(callback, match_id, [f'{changed[0]}.{changed[1]}']))
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            if not self.load_page():
+                time.sleep(0.5)  # server not answering, don't spin
+                continue
+            # A session: a handful of clicks, then a new page load
+            for _ in range(self.rng.integers(3, 12)):
+                if time.monotonic() >= deadline:
+                    return
+                component_id, prop = INTERACTIONS[self.rng.integers(len(INTERACTIONS))]
+                choices = [value for value in self.options.get(component_id, [])
+                           if value != self.values.get((component_id, prop))]
+                if choices:
+                    self.change(component_id, prop, choices[self.rng.integers(len(choices))])
+                if self.think_time:
+                    time.sleep(self.rng.exponential(self.think_time))
+
+
+def run_load(url, users, duration, think_time=0.0, ramp_up=0.0, seed=0):
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    threads = []
+    for i in range(users):
+        user = User(url, stats, think_time, np.random.default_rng(seed + i))
+        thread = threading.Thread(target=user.run, args=(deadline,), name=f'user-{i}', daemon=True)
+        thread.start()
+        threads.append(thread)
+        if ramp_up:
+            time.sleep(ramp_up / users)
+    start = deadline - duration
+    for thread in threads:
+        thread.join()
+    return stats.report(time.monotonic() - start)
+
+
+def start_app(port, workers, threads):
+    """Start serve.py on 127.0.0.1:port and wait until /readyz says so."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=REPO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    started = time.monotonic()
+    while time.monotonic() - started < 300:
+        if process.poll() is not None:
+            raise RuntimeError(f'serve.py exited with {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/readyz')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError('serve.py did not get ready in 300 s')
+
+
+def print_report(report, users):
+    total = report['total']
+    if total is None:
+        print(f'{users} users: no requests completed')
+        return
+    print(f"{users} users, {report['duration_s']:.0f} s: {total['requests']} requests, "
+          f"{total['throughput_rps']:.1f} req/s, {total['error_rate']:.2%} errors")
+    print(f"  {'request':<58} {'count':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for label, row in report['requests'].items():
+        print(f"  {label[:58]:<58} {row['requests']:>7} {row['throughput_rps']:>7.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['error_rate']:>7.2%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8050', help='app to load (default http://127.0.0.1:8050)')
+    parser.add_argument('--start', action='store_true', help='start the app with serve.py on the --url port first')
+    parser.add_argument('--workers', type=int, default=1, help='serve.py workers with --start (default 1)')
+    parser.add_argument('--threads', type=int, default=4, help='serve.py threads per worker with --start (default 4)')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16],
+                        help='concurrent users; several values run one after the other (default: 1 4 16)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per run (default 30)')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='mean seconds between a user\'s clicks (default 0: as fast as possible)')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='seconds over which the users start')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args()
+
+    server = start_app(urllib.parse.urlsplit(args.url).port or 80, args.workers, args.threads) if args.start else None
+    try:
+        reports = {}
+        for users in args.users:
+            report = run_load(args.url, users, args.duration, args.think_time, args.ramp_up, args.seed)
+            print_report(report, users)
+            reports[str(users)] = report
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'runs': reports}, f, indent=2)
+            f.write('\n')
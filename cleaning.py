@@ -0,0 +1,145 @@
+import argparse
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from validation import log_report, merge_reports, validate, write_quarantine
+
+logger = logging.getLogger(__name__)
+
+# The cleaning steps of CodeToCleanSalesData.ipynb, as code the app can reuse
+RAW_DROP_COLUMNS = ['Country', 'Postal Code']
+RENAME_COLUMNS = {'Segment': 'Type_of_customer'}
+
+# The raw CSV is read as text, so every chunk parses the same way and a blank
+# or garbled measure reaches validate() (which quarantines the row and
+# converts the measures of the rest) instead of failing the whole read
+RAW_DTYPES = {
+    'Ship Mode': str, 'Segment': str, 'City': str, 'State': str, 'Region': str,
+    'Category': str, 'Sub-Category': str,
+    'Sales': str, 'Quantity': str, 'Discount': str, 'Profit': str,
+}
+
+
+def clean_rows(raw):
+    """Drop Country/Postal Code, rename Segment and fix the negative profits.
+
+    Duplicates are not removed here, see RowDeduplicator.
+    """
+    df = raw.drop(columns=[column for column in RAW_DROP_COLUMNS if column in raw.columns])
+    df = df.rename(columns=RENAME_COLUMNS)
+    # The profit has negative values which have to be a mistake (values that
+    # aren't numbers are left for validate() to quarantine)
+    profit = pd.to_numeric(df['Profit'], errors='coerce')
+    df['Profit'] = profit.abs().where(profit.notna(), df['Profit'])
+    return df
+
+
+def row_hashes(df):
+    # One 64 bit hash per row over all of its values (categories hash like their labels)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+class RowDeduplicator:
+    """Drops rows already seen, in this batch or any earlier one.
+
+    Only the 64 bit hash of each row is remembered, in a few sorted runs that
+    are merged as they grow (like an LSM tree), so lookups are vectorized
+    binary searches and the memory used is 8 bytes per distinct row.
+    """
+
+    def __init__(self):
+        self._runs = []  # sorted arrays of unique hashes, largest first
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    def _seen(self, hashes):
+        seen = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            seen |= run[positions] == hashes
+        return seen
+
+    def _remember(self, hashes):
+        if not len(hashes):
+            return
+        self._runs.append(np.unique(hashes))
+        # Merge runs of similar size so there are only O(log n) of them
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            self._runs[-1] = np.union1d(self._runs[-1], last)
+
+    def add(self, df):
+        self._remember(row_hashes(df))
+
+    def unique_rows(self, df):
+        hashes = row_hashes(df)
+        keep = np.zeros(len(hashes), dtype=bool)
+        keep[np.unique(hashes, return_index=True)[1]] = True  # first copy within the batch
+        keep &= ~self._seen(hashes)
+        self._remember(hashes[keep])
+        return df[keep]
+
+
+def clean_csv(source, target, chunksize=100_000, quarantine=None):
+    """Clean the raw Superstore CSV `source` into `target`, one chunk at a time.
+
+    Only one chunk is in memory at once (plus the row hashes used to drop
+    duplicates), so this works on exports much bigger than RAM. `target` is
+    written to a temporary file and renamed at the end, so readers never see a
+    half written file. Every chunk is validated (see validation.py); failing
+    rows go to `quarantine` (default: `<target>.quarantine.csv`) instead.
+    Returns counts of rows read, written and dropped, and the validation report.
+    """
+    if quarantine is None:
+        quarantine = os.path.splitext(target)[0] + '.quarantine.csv'
+    if os.path.exists(quarantine):
+        os.remove(quarantine)  # from an earlier run
+    stats = {'rows_read': 0, 'rows_written': 0, 'duplicates': 0, 'quarantined': 0}
+    report = None
+    dedup = RowDeduplicator()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as out:
+            chunks = pd.read_csv(
+                source,
+                chunksize=chunksize,
+                usecols=lambda column: column not in RAW_DROP_COLUMNS,
+                dtype=RAW_DTYPES,
+            )
+            for i, chunk in enumerate(chunks):
+                cleaned = dedup.unique_rows(clean_rows(chunk))
+                # Duplicates are already gone, across chunks too
+                valid, rejected, chunk_report = validate(cleaned, check_duplicates=False)
+                valid.to_csv(out, header=(i == 0), index=False)
+                if len(rejected):
+                    write_quarantine(rejected, quarantine, append=stats['quarantined'] > 0)
+                report = merge_reports(report, chunk_report)
+                stats['rows_read'] += len(chunk)
+                stats['rows_written'] += len(valid)
+                stats['duplicates'] += len(chunk) - len(cleaned)
+                stats['quarantined'] += len(rejected)
+        os.replace(tmp, target)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    if report is not None:
+        log_report(source, report)
+    stats['validation'] = report
+    logger.info('Cleaned %s -> %s: %s', source, target,
+                {key: value for key, value in stats.items() if key != 'validation'})
+    return stats
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Clean a raw Superstore CSV export, streaming it in chunks.')
+    parser.add_argument('source', help='raw CSV, e.g. SampleSuperstore.csv')
+    parser.add_argument('target', help='cleaned CSV to write, e.g. cleanSalesData.csv')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='rows per chunk (default 100000)')
+    args = parser.parse_args()
+    clean_csv(args.source, args.target, chunksize=args.chunksize)
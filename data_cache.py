@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from schema import SCHEMA_ID, apply_schema, format_memory_report
+from validation import RULES_ID, log_report, validate, write_quarantine
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+INDEX = 'index.json'
+# Rows of the source that failed validation, next to the columns built from the rest
+QUARANTINE = 'quarantine.csv'
+# Names of the cache entries: <source file stem>-<content hash>-<schema id>-<rules id>
+ENTRY_NAME = re.compile(r'(?P<stem>.+)-[0-9a-f]{16}-[0-9a-f]{8}-[0-9a-f]{8}')
+
+
+def file_hash(path, block_size=1 << 20):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write next to the target and rename so readers never see half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def source_fingerprint(path, cache_dir):
+    """Size, mtime and content hash of the source file.
+
+    Hashing a large CSV on every start would defeat the point of the cache, so
+    the hash is looked up in the cache index when size and mtime are unchanged
+    and only recomputed when one of them moves.
+    """
+    stat = os.stat(path)
+    index_path = os.path.join(cache_dir, INDEX)
+    index = _read_json(index_path) or {}
+    key = os.path.abspath(path)
+    known = index.get(key)
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known
+
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_hash(path)}
+    index[key] = fingerprint
+    _write_json(index_path, index)
+    return fingerprint
+
+
+def _codes_dtype(n_categories):
+    # Same code width pandas picks for a Categorical, so from_codes doesn't copy
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def write_columns(df, target_dir, fingerprint, memory_report=None, validation=None):
+    """Store every column of df as its own .npy file in target_dir.
+
+    String columns are dictionary encoded: integer codes in `<i>.codes.npy`
+    and the distinct values in `<i>.categories.npy`.
+    """
+    os.makedirs(target_dir)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categorical = series.array
+        elif series.dtype.kind in 'biuf':
+            np.save(os.path.join(target_dir, f'{i}.npy'), series.to_numpy())
+            columns.append({'name': name, 'kind': 'numeric', 'file': f'{i}.npy'})
+            continue
+        else:
+            categorical = pd.Categorical(series)
+        categories = np.asarray(categorical.categories, dtype=str)
+        codes = categorical.codes.astype(_codes_dtype(len(categories)))
+        np.save(os.path.join(target_dir, f'{i}.codes.npy'), codes)
+        np.save(os.path.join(target_dir, f'{i}.categories.npy'), categories)
+        columns.append({
+            'name': name,
+            'kind': 'category',
+            'codes': f'{i}.codes.npy',
+            'categories': f'{i}.categories.npy',
+        })
+    _write_json(os.path.join(target_dir, MANIFEST), {
+        'source': fingerprint,
+        'n_rows': len(df),
+        'columns': columns,
+        'memory_report': memory_report,
+        'validation': validation,
+    })
+
+
+def read_columns(cache_path, columns=None):
+    """Memory-map a directory written by write_columns back into a DataFrame.
+
+    The numeric columns and category codes stay backed by the files, so every
+    process loading the same cache shares the same pages of the page cache.
+    With `columns`, only those are read (and nothing is logged).
+    """
+    manifest = _read_json(os.path.join(cache_path, MANIFEST))
+    data = {}
+    for column in manifest['columns']:
+        if columns is not None and column['name'] not in columns:
+            continue
+        if column['kind'] == 'numeric':
+            data[column['name']] = np.load(os.path.join(cache_path, column['file']), mmap_mode='r')
+        else:
+            codes = np.load(os.path.join(cache_path, column['codes']), mmap_mode='r')
+            categories = np.load(os.path.join(cache_path, column['categories']))
+            data[column['name']] = pd.Categorical.from_codes(codes, categories=categories, validate=False)
+    df = pd.DataFrame(data, copy=False)
+    # Identifies the data this frame was loaded from, for keying derived caches
+    df.attrs['version'] = os.path.basename(cache_path)
+    if columns is not None:
+        return df
+    if manifest.get('memory_report'):
+        logger.info('Loaded %s (%s rows), memory vs. default dtypes:\n%s', cache_path,
+                    f"{manifest['n_rows']:,}", format_memory_report(manifest['memory_report']))
+    if manifest.get('validation'):
+        log_report(cache_path, manifest['validation'])
+    return df
+
+
+def load_sales_data(path, cache_dir):
+    """Load the cleaned CSV, going through the columnar cache in cache_dir."""
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = source_fingerprint(path, cache_dir)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f"{stem}-{fingerprint['sha1'][:16]}-{SCHEMA_ID}-{RULES_ID}")
+
+    if not os.path.exists(os.path.join(cache_path, MANIFEST)):
+        # Build in a private directory and rename it into place; if another
+        # worker got there first, keep theirs and throw ours away
+        tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=f'{stem}-building-')
+        try:
+            # Rows failing validation are kept out of the data and written to
+            # quarantine.csv in the cache directory instead
+            valid, quarantined, validation = validate(pd.read_csv(path))
+            df, memory_report = apply_schema(valid)
+            write_columns(df, os.path.join(tmp_path, 'columns'), fingerprint, memory_report, validation)
+            if len(quarantined):
+                write_quarantine(quarantined, os.path.join(tmp_path, 'columns', QUARANTINE))
+            try:
+                os.rename(os.path.join(tmp_path, 'columns'), cache_path)
+            except OSError:
+                if not os.path.exists(os.path.join(cache_path, MANIFEST)):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    return read_columns(cache_path)
+
+
+def remove_stale_entries(cache_dir, current):
+    """Delete the entries in cache_dir built from other versions of the source of `current`.
+
+    `current` is the name of the entry in use, e.g. a dataset's version. Entries
+    of other sources and ones still being built are left alone. A process still
+    mapping a removed entry keeps reading it until it lets go (on POSIX).
+    """
+    stem = ENTRY_NAME.fullmatch(current).group('stem')
+    removed = []
+    for name in os.listdir(cache_dir):
+        match = ENTRY_NAME.fullmatch(name)
+        if name == current or match is None or match.group('stem') != stem:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        removed.append(name)
+    if removed:
+        logger.info('Removed %d stale cache entries from %s: %s', len(removed), cache_dir, ', '.join(removed))
+    return removed
@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from cleaning import RowDeduplicator, clean_rows
+from filter_engine import FilterEngine
+from regression import StateTrend
+from sales_cube import build_cube
+from schema import downcast
+from sketches import SketchSet
+from validation import validate
+
+
+def _concat(frames):
+    # pd.concat turns categoricals with different categories into object
+    # columns, so merge the categories explicitly
+    columns = {}
+    for name in frames[0].columns:
+        parts = [frame[name] for frame in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[name] = union_categoricals(parts)
+        else:
+            columns[name] = np.concatenate([part.to_numpy() for part in parts])
+    return pd.DataFrame(columns)
+
+
+class SalesDataset:
+    """The sales rows, their cube and a version string, kept in step.
+
+    append() takes new raw rows, cleans and validates them like a loaded file,
+    drops duplicates and adds them to the cube by delta. The version changes with
+    every batch that adds rows, so caches keyed on it drop stale figures.
+
+    `lock` is only held while a batch is put in place; the work proportional
+    to all rows so far (hashing them for duplicates) happens once, outside it,
+    in prepare_append().
+    """
+
+    def __init__(self, df, version):
+        self.base_version = version
+        self.cube = build_cube(df)
+        self.batches = 0
+        self.lock = threading.RLock()
+        self._append_lock = threading.Lock()  # one batch at a time
+        self._frames = [df]
+        self._dedup = None  # built by prepare_append(), most apps never need it
+        self._filters = {}  # name -> (version, FilterEngine)
+        self._trend = None
+        self._sketches = None
+
+    @property
+    def version(self):
+        return self.base_version if not self.batches else f'{self.base_version}+{self.batches}'
+
+    @property
+    def rows(self):
+        # Appended batches are only glued onto the frame when row level data is asked for
+        with self.lock:
+            if len(self._frames) > 1:
+                self._frames = [_concat(self._frames)]
+            return self._frames[0]
+
+    def _filter_engine(self, name, build):
+        with self.lock:
+            version, engine = self._filters.get(name, (None, None))
+            if version != self.version:
+                engine = build()
+                self._filters[name] = (self.version, engine)
+            return engine
+
+    @property
+    def cell_filter(self):
+        # Cross-filters over the cube cells: for charts that only need aggregates
+        return self._filter_engine('cells', lambda: FilterEngine.from_cube(self.cube))
+
+    @property
+    def row_filter(self):
+        # Cross-filters over the rows themselves: for row level charts
+        return self._filter_engine('rows', lambda: FilterEngine.from_rows(self.rows))
+
+    @property
+    def state_trend(self):
+        # Sales vs rows per state and its regression, kept up to date by append()
+        with self.lock:
+            if self._trend is None:
+                self._trend = StateTrend.from_rollup(self.cube.rollup(['State'], ['Sales'], count=True))
+            return self._trend
+
+    @property
+    def sketches(self):
+        # Quantile sketches per dimension value (sketches.SketchSet); append()
+        # merges in the sketches of each new batch
+        with self.lock:
+            if self._sketches is None:
+                self._sketches = SketchSet.from_frame(self.rows)
+            return self._sketches
+
+    def _conform(self, batch):
+        # Same columns, order and dtypes as the loaded frame
+        columns = {}
+        for name, dtype in self._frames[0].dtypes.items():
+            values = batch[name]
+            if isinstance(dtype, pd.CategoricalDtype):
+                columns[name] = values.astype(str).astype('category')
+                continue
+            cast = downcast(values.to_numpy(), dtype)
+            if cast is None:
+                raise ValueError(f'{name} values of the new rows do not fit in {dtype}')
+            columns[name] = cast
+        return pd.DataFrame(columns)
+
+    def _deduplicator(self):
+        # Hashes of every row so far; with _append_lock held, so no batch is
+        # added meanwhile, but readers (which only take `lock`) carry on
+        if self._dedup is None:
+            dedup = RowDeduplicator()
+            for frame in list(self._frames):
+                dedup.add(frame)
+            self._dedup = dedup
+        return self._dedup
+
+    def prepare_append(self):
+        """Hash the rows for append()'s duplicate check now rather than on the first append."""
+        with self._append_lock:
+            self._deduplicator()
+
+    def append(self, raw):
+        """Clean, validate and add a batch of new rows.
+
+        Returns (number of rows actually added, quarantined rows with their
+        `failed_checks`); quarantined rows never reach the cube.
+        """
+        # Duplicates are checked against every earlier batch below, not by validate()
+        valid, quarantined, _ = validate(clean_rows(raw), check_duplicates=False)
+        batch = self._conform(valid)
+        with self._append_lock:
+            batch = self._deduplicator().unique_rows(batch).reset_index(drop=True)
+            if not len(batch):
+                return 0, quarantined
+            sketches = SketchSet.from_frame(batch) if self._sketches is not None else None
+            # The row filter is extended rather than rebuilt over every row
+            version, row_filter = self._filters.get('rows', (None, None))
+            row_filter = row_filter.extended(batch) if row_filter is not None and version == self.version else None
+            with self.lock:
+                self.cube.append(batch)
+                if self._trend is not None:
+                    self._trend.add_rows(batch['State'], batch['Sales'].to_numpy())
+                if self._sketches is not None:
+                    if sketches is None:  # built by a reader meanwhile
+                        sketches = SketchSet.from_frame(batch)
+                    self._sketches = self._sketches.merge(sketches)
+                self._frames.append(batch)
+                self.batches += 1
+                if row_filter is not None and self._filters['rows'][0] == version:
+                    self._filters['rows'] = (self.version, row_filter)
+        return len(batch), quarantined
@@ -0,0 +1,38 @@
+import numpy as np
+
+
+def density_grid(x, y, x_bins=40, y_bins=40):
+    """Count the (x, y) points falling in each cell of a regular grid.
+
+    Returns (x_centers, y_centers, counts) with counts shaped (y_bins, x_bins),
+    ready to be used as the z of a heatmap. Empty cells are NaN so they are
+    drawn as gaps. The size of the result only depends on the number of bins.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=(x_bins, y_bins))
+    return grid_result(counts, x_edges, y_edges)
+
+
+def grid_edges(low, high, bins):
+    # The bin edges np.histogram2d picks for data between low and high
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def grid_result(counts, x_edges, y_edges):
+    """density_grid()'s result from histogram2d counts, e.g. summed over several chunks."""
+    counts = counts.T.astype(np.float32)
+    counts[counts == 0] = np.nan
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return x_centers, y_centers, counts
+
+
+def sample_rows(n_rows, budget, seed=0):
+    """Indices of at most `budget` rows, picked uniformly and kept in order."""
+    if n_rows <= budget:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(seed)  # fixed seed: the same sample on every build
+    return np.sort(rng.choice(n_rows, size=budget, replace=False))
@@ -0,0 +1,101 @@
+"""Streaming CSV and Parquet encoders for the /api/export routes.
+
+Both take an iterable of DataFrames (a rollup, or row-level chunks from a
+backend's scan_rows()) and yield the file piece by piece, so only one chunk
+is ever encoded at a time, whatever the size of the export.
+"""
+import pandas as pd
+from flask import Response, stream_with_context
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only Parquet exports need it
+    pa = pq = None
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def csv_chunks(frames):
+    header = True
+    for frame in frames:
+        if not len(frame) and not header:
+            continue
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+
+
+class _Pending:
+    # Write-only file object handing whatever was written to the next yield
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_table(frame):
+    # Categories as plain strings: their codes' width can differ between chunks
+    categorical = [name for name, dtype in frame.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if categorical:
+        frame = frame.astype({name: str for name in categorical})
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def parquet_chunks(frames):
+    # One row group per non-empty frame; the footer goes out last
+    sink = _Pending()
+    writer = None
+    empty = None
+    for frame in frames:
+        if not len(frame):
+            empty = frame if empty is None else empty
+            continue
+        table = _arrow_table(frame)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table.cast(writer.schema))
+        data = sink.drain()
+        if data:
+            yield data
+    if writer is None:
+        # Nothing matched: still a valid file, with the columns
+        writer = pq.ParquetWriter(sink, _arrow_table(empty).schema)
+    writer.close()
+    yield sink.drain()
+
+
+def stream(frames, fmt, filename, version):
+    """Response streaming `frames` as a `fmt` file, tagged with the data version."""
+    mimetype, extension = FORMATS[fmt]
+    chunks = csv_chunks(frames) if fmt == 'csv' else parquet_chunks(frames)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}-{version}.{extension}"',
+            'X-Dataset-Version': version,
+        },
+    )
@@ -0,0 +1,114 @@
+import functools
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+from metrics import phase
+from payload import compact_figure
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    # Callback inputs can be dicts/lists (e.g. a dcc.Store), which can't be dict keys
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class CachedFigure:
+    # The figure already decoded into plain dicts/lists with compact typed
+    # arrays, which Dash can dump without touching Plotly, and the size of
+    # its JSON, measured once when it's built
+    __slots__ = ('figure', 'nbytes')
+
+    def __init__(self, figure, nbytes):
+        self.figure = figure
+        self.nbytes = nbytes
+
+    @classmethod
+    @phase('serialize')
+    def from_figure(cls, figure):
+        # Serialize a go.Figure or figure dict with compact typed arrays
+        figure = compact_figure(json.loads(to_json_plotly(figure)))
+        return cls(figure, len(json.dumps(figure, separators=(',', ':'))))
+
+
+class FigureCache:
+    """Bounded LRU cache of callback figures.
+
+    Keys are (callback name, callback inputs, dataset version), so a new
+    dataset version never serves figures built from the old data. Figures are
+    stored as Plotly's JSON output decoded into plain dicts/lists: a hit skips
+    building the go.* objects, their validation and the numpy -> JSON
+    conversion.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            counter = self.misses if entry is None else self.hits
+            counter[key[0]] = counter.get(key[0], 0) + 1
+            return entry
+
+    def put(self, key, figure):
+        entry = CachedFigure.from_figure(figure)
+        logger.debug('Cached %s: %d bytes', key[0], entry.nbytes)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+                'evictions': self.evictions,
+                'per_callback': {
+                    name: {'hits': self.hits.get(name, 0), 'misses': self.misses.get(name, 0)}
+                    for name in sorted(set(self.hits) | set(self.misses))
+                },
+            }
+
+    def cached(self, name, version):
+        """Decorator for a figure callback; `version` returns the current dataset version."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = (name, _freeze(args), version())
+                entry = self.get(key)
+                if entry is None:
+                    entry = self.put(key, func(*args))
+                return entry.figure
+            return wrapper
+        return decorator
@@ -0,0 +1,147 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from figure_cache import CachedFigure
+from metrics import track_figure
+
+logger = logging.getLogger(__name__)
+
+# The registry whose figures a forked build_all() worker builds
+_forked_registry = None
+
+
+def _build_forked(name):
+    return _forked_registry._build(name)
+
+
+class FigureRegistry:
+    """Named figure builders that only run the first time a figure is asked for.
+
+    Built figures are kept as plain dicts (see figure_cache.CachedFigure) and are
+    thrown away when `version()` changes, so the next request rebuilds them
+    from the new data.
+    """
+
+    def __init__(self, version=lambda: None):
+        self.version = version
+        self._builders = {}
+        self._cross_filtered = set()
+        self._figures = {}  # name -> (version, CachedFigure)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, cross_filtered=False):
+        """Register a builder; cross_filtered builders take the current selection."""
+        def decorator(builder):
+            self._builders[name] = builder
+            if cross_filtered:
+                self._cross_filtered.add(name)
+            self._locks[name] = threading.Lock()
+            return builder
+        return decorator
+
+    @property
+    def names(self):
+        return list(self._builders)
+
+    def is_cross_filtered(self, name):
+        return name in self._cross_filtered
+
+    def build(self, name, *args):
+        # Runs the builder right away, without keeping the result (e.g. for a
+        # cross-filter); timed in the metrics like the cached builds
+        with track_figure(name):
+            return self._builders[name](*args)
+
+    def built(self):
+        version = self.version()
+        with self._lock:
+            return [name for name, (v, _) in self._figures.items() if v == version]
+
+    def _build(self, name):
+        # (CachedFigure, seconds spent building and serializing it)
+        start = time.perf_counter()
+        with track_figure(name):
+            entry = CachedFigure.from_figure(self._builders[name]())
+        seconds = time.perf_counter() - start
+        logger.info('Built figure %s in %.0f ms: %d bytes', name, seconds * 1000, entry.nbytes)
+        return entry, seconds
+
+    def _store(self, name, version, entry):
+        with self._lock:
+            self._figures[name] = (version, entry)
+
+    def entry(self, name):
+        version = self.version()
+        built = self._figures.get(name)
+        if built is not None and built[0] == version:
+            return built[1]
+
+        # One lock per figure: concurrent requests for the same figure wait for
+        # a single build, requests for different figures don't block each other
+        with self._locks[name]:
+            built = self._figures.get(name)
+            if built is None or built[0] != version:
+                entry, _ = self._build(name)
+                self._store(name, version, entry)
+                built = (version, entry)
+        return built[1]
+
+    def _timed_entry(self, name):
+        start = time.perf_counter()
+        self.entry(name)
+        return time.perf_counter() - start
+
+    def build_all(self, workers=1, pool='thread', names=None):
+        """Build the figures `names` (default: all) not built yet, up to `workers` at a time.
+
+        With pool='thread' the builds share this process: numpy, pandas and
+        the JSON encoding overlap, Plotly's validation is held up by the GIL.
+        pool='process' builds each figure in a forked process and only sends
+        its JSON back, so everything runs in parallel (but the build metrics
+        of those processes are lost). Returns {name: seconds}.
+        """
+        version = self.version()
+        built = set(self.built())
+        names = [name for name in (self.names if names is None else names) if name not in built]
+        workers = max(1, min(workers, len(names)))
+        if pool == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning('Cannot fork here, building the figures with threads')
+            pool = 'thread'
+
+        start = time.perf_counter()
+        if workers == 1:
+            timings = {name: self._timed_entry(name) for name in names}
+        elif pool == 'process':
+            global _forked_registry
+            _forked_registry = self
+            try:
+                context = multiprocessing.get_context('fork')
+                with ProcessPoolExecutor(workers, mp_context=context) as executor:
+                    results = dict(zip(names, executor.map(_build_forked, names)))
+            finally:
+                _forked_registry = None
+            timings = {}
+            for name, (entry, seconds) in results.items():
+                self._store(name, version, entry)
+                timings[name] = seconds
+        else:
+            with ThreadPoolExecutor(workers, thread_name_prefix='figure-build') as executor:
+                timings = dict(zip(names, executor.map(self._timed_entry, names)))
+
+        if names:
+            logger.info('Built %d figures in %.2f s (%d %s workers); slowest: %s', len(names),
+                        time.perf_counter() - start, workers, pool,
+                        ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in
+                                  sorted(timings.items(), key=lambda item: -item[1])[:3]))
+        return timings
+
+    def get(self, name):
+        return self.entry(name).figure
+
+    def invalidate(self):
+        with self._lock:
+            self._figures.clear()
@@ -0,0 +1,172 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from sales_cube import DIMENSIONS, MEASURES
+
+
+def selection_key(selection):
+    """Hashable, order independent form of a {dimension: [values]} selection."""
+    return tuple(sorted((dim, tuple(sorted(values))) for dim, values in (selection or {}).items() if values))
+
+
+class FilterEngine:
+    """Cross-filtering over a table of dimension codes and measures.
+
+    For every dimension the row ids are kept grouped by value (a sorted row-id
+    index, built the first time the dimension is filtered on), so the rows
+    matching a value are a slice, not a scan. A selection starts from its
+    smallest matching set and only checks the other dimensions on those rows,
+    then every grouping asked for is aggregated from the same filtered rows.
+
+    The table can be the raw rows, or the cells of a SalesCube with their row
+    counts as `counts`, which keeps the cost independent of the number of orders.
+    """
+
+    def __init__(self, codes, labels, measures, counts=None):
+        self.codes = codes  # dimension -> code of each row
+        self.labels = labels  # dimension -> label of each code
+        self.measures = measures  # measure -> value of each row
+        self.counts = counts  # rows behind each entry (cube cells), None = one each
+        self.n_rows = len(next(iter(codes.values())))
+        self._index = {}
+        self._code_of = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, df, dimensions=DIMENSIONS, measures=MEASURES):
+        codes, labels = {}, {}
+        for dim in dimensions:
+            if isinstance(df[dim].dtype, pd.CategoricalDtype):
+                codes[dim] = df[dim].cat.codes.to_numpy()
+                labels[dim] = np.asarray(df[dim].cat.categories, dtype=object)
+            else:
+                codes[dim], labels[dim] = pd.factorize(df[dim])
+                labels[dim] = np.asarray(labels[dim], dtype=object)
+        return cls(codes, labels, {measure: df[measure].to_numpy() for measure in measures})
+
+    @classmethod
+    def from_cube(cls, cube):
+        with cube.lock:
+            return cls(
+                {dim: codes.copy() for dim, codes in cube.codes.items()},
+                {dim: labels.copy() for dim, labels in cube.dictionaries.items()},
+                {measure: sums.copy() for measure, sums in cube.sums.items()},
+                counts=cube.counts.copy(),
+            )
+
+    def extended(self, df):
+        """A new engine over these rows followed by the rows of df.
+
+        Only for row tables (no `counts`). The codes of the rows already here
+        are kept, labels df brings in are added after the known ones, and the
+        row-id indexes built so far are merged with df's instead of sorted
+        again: O(rows) copying plus O(len(df) log len(df)).
+        """
+        codes, labels, new_codes = {}, {}, {}
+        n_old, n_new = self.n_rows, len(df)
+        for dim, old_codes in self.codes.items():
+            values = df[dim].astype(object)
+            new = pd.unique(values[~values.isin(self.labels[dim])])
+            labels[dim] = np.concatenate([self.labels[dim], np.asarray(new, dtype=object)])
+            batch_codes = pd.Categorical(values, categories=labels[dim]).codes
+            dtype = old_codes.dtype
+            if np.iinfo(dtype).max < len(labels[dim]):
+                dtype = np.int32
+            codes[dim] = np.concatenate([old_codes.astype(dtype, copy=False), batch_codes.astype(dtype)])
+            new_codes[dim] = batch_codes
+        engine = FilterEngine(codes, labels, {measure: np.concatenate([values, df[measure].to_numpy()])
+                                              for measure, values in self.measures.items()})
+
+        for dim, (order, offsets) in list(self._index.items()):
+            n_labels = len(labels[dim])
+            batch_codes = new_codes[dim].astype(np.intp)
+            batch_order = np.argsort(batch_codes, kind='stable')
+            batch_offsets = np.concatenate([[0], np.cumsum(np.bincount(batch_codes, minlength=n_labels))])
+            # No rows here yet for the labels df added
+            offsets = np.concatenate([offsets, np.full(n_labels + 1 - len(offsets), offsets[-1])])
+            merged = np.empty(n_old + n_new, dtype=np.int32 if n_old + n_new < 2 ** 31 else np.int64)
+            # Each old row moves up by the new rows of smaller values, each new
+            # one goes after all old rows of its value and up to its own
+            old_codes = np.repeat(np.arange(n_labels), np.diff(offsets))
+            merged[np.arange(n_old) + batch_offsets[old_codes]] = order
+            merged[np.arange(n_new) + offsets[batch_codes[batch_order] + 1]] = batch_order + n_old
+            engine._index[dim] = (merged, offsets + batch_offsets)
+        return engine
+
+    def _dim_index(self, dim):
+        # Row ids ordered by value (stable, so ascending within a value) and
+        # where each value's slice starts
+        index = self._index.get(dim)
+        if index is None:
+            with self._lock:
+                index = self._index.get(dim)
+                if index is None:
+                    codes = self.codes[dim].astype(np.intp)
+                    order = np.argsort(codes, kind='stable')
+                    order = order.astype(np.int32 if self.n_rows < 2 ** 31 else np.int64)
+                    sizes = np.bincount(codes, minlength=len(self.labels[dim]))
+                    offsets = np.concatenate([[0], np.cumsum(sizes)])
+                    index = self._index[dim] = (order, offsets)
+        return index
+
+    def _codes_of(self, dim, values):
+        if dim not in self._code_of:
+            self._code_of[dim] = {label: code for code, label in enumerate(self.labels[dim])}
+        code_of = self._code_of[dim]
+        return np.array([code_of[v] for v in values if v in code_of], dtype=np.intp)
+
+    def select(self, selection):
+        """Sorted ids of the rows matching every dimension of `selection`, or None for all rows."""
+        selection = {dim: values for dim, values in (selection or {}).items() if values}
+        if not selection:
+            return None
+
+        codes = {dim: self._codes_of(dim, values) for dim, values in selection.items()}
+        sizes = {}
+        for dim, dim_codes in codes.items():
+            _, offsets = self._dim_index(dim)
+            sizes[dim] = int((offsets[dim_codes + 1] - offsets[dim_codes]).sum())
+        dims = sorted(codes, key=sizes.get)
+
+        order, offsets = self._dim_index(dims[0])
+        ids = np.sort(np.concatenate(
+            [order[offsets[code]:offsets[code + 1]] for code in codes[dims[0]]] or [order[:0]]))
+        for dim in dims[1:]:
+            ids = ids[np.isin(self.codes[dim][ids], codes[dim])]
+        return ids
+
+    def aggregate(self, selection, groupings, measures=None):
+        """Totals and per-value sums of the rows matching `selection`, in one pass.
+
+        Returns (totals, {dimension: DataFrame(dimension, *measures, Count)})
+        with every dimension in `groupings`, sorted by label like a groupby.
+        """
+        measures = list(self.measures) if measures is None else list(measures)
+        ids = self.select(selection)
+        take = (lambda values: values) if ids is None else (lambda values: values[ids])
+
+        values = {measure: take(self.measures[measure]) for measure in measures}
+        counts = None if self.counts is None else take(self.counts)
+        totals = {measure: column.sum() for measure, column in values.items()}
+        if counts is not None:
+            totals['Count'] = int(counts.sum())
+        else:
+            totals['Count'] = self.n_rows if ids is None else len(ids)
+
+        groups = {}
+        for dim in groupings:
+            keys = take(self.codes[dim]).astype(np.intp)
+            length = len(self.labels[dim])
+            group_counts = np.bincount(keys, weights=counts, minlength=length).astype(np.int64)
+            present = group_counts > 0
+            result = {dim: self.labels[dim][present]}
+            for measure, column in values.items():
+                sums = np.bincount(keys, weights=column, minlength=length)
+                if column.dtype.kind in 'iu':
+                    sums = np.rint(sums).astype(np.int64)
+                result[measure] = sums[present]
+            result['Count'] = group_counts[present]
+            groups[dim] = pd.DataFrame(result).sort_values(by=dim, kind='stable').reset_index(drop=True)
+        return totals, groups
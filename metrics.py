@@ -0,0 +1,238 @@
+"""Timings of callbacks and figure builds, served in Prometheus text format.
+
+Every /_dash-update-component request is timed per callback output, and so is
+every figure build in FigureRegistry. The time is split into phases: `data`
+(backend queries, see phase()), `serialize` (turning the figure into JSON)
+and `figure` (the rest, mostly building the go.* objects). Response sizes
+and the figure cache hit ratio are exported too.
+
+With settings.METRICS_ENABLED off nothing is wrapped or recorded: phase()
+returns the function itself and track_figure() a no-op context.
+
+Each process keeps its own numbers, so with several gunicorn workers a
+scrape only sees the worker that answered it.
+"""
+import contextlib
+import functools
+import json
+import threading
+import time
+
+from flask import Response, request
+
+import settings
+
+ENABLED = settings.METRICS_ENABLED
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1_000, 4_000, 16_000, 64_000, 256_000, 1_000_000, 4_000_000, 16_000_000)
+PHASES = ('data', 'figure', 'serialize')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, values in series:
+            for bound, count in zip(self.buckets + ('+Inf',), values[:-2] + values[-1:]):
+                bucket_labels = _labels(self.labels, label_values, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{bucket_labels} {count}')
+            labels = _labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {values[-2]}')
+            lines.append(f'{self.name}_count{labels} {values[-1]}')
+        return lines
+
+
+CALLBACK_SECONDS = Histogram(
+    'sales_callback_seconds', 'Time to answer a Dash callback request.', ('output',), SECONDS_BUCKETS)
+CALLBACK_PHASE_SECONDS = Histogram(
+    'sales_callback_phase_seconds', 'Time spent per phase while answering a Dash callback request.',
+    ('output', 'phase'), SECONDS_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'sales_callback_response_bytes', 'Size of Dash callback responses as sent.', ('output',), BYTES_BUCKETS)
+FIGURE_SECONDS = Histogram(
+    'sales_figure_build_seconds', 'Time to build and serialize a registered figure.', ('figure',), SECONDS_BUCKETS)
+FIGURE_PHASE_SECONDS = Histogram(
+    'sales_figure_phase_seconds', 'Time spent per phase while building a registered figure.',
+    ('figure', 'phase'), SECONDS_BUCKETS)
+
+# Records of the callbacks/figure builds running on this thread, innermost last
+_local = threading.local()
+
+
+def _records():
+    records = getattr(_local, 'records', None)
+    if records is None:
+        records = _local.records = []
+    return records
+
+
+class _Record:
+    __slots__ = ('start', 'phases', 'depth')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.depth = dict.fromkeys(PHASES, 0)
+
+    def finish(self):
+        # Time not spent querying or serializing went into building the figure
+        elapsed = time.perf_counter() - self.start
+        self.phases['figure'] = max(elapsed - self.phases['data'] - self.phases['serialize'], 0.0)
+        return elapsed
+
+
+def phase(name):
+    """Decorator counting the time spent in a function as phase `name` of whatever is being tracked."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            records = _records()
+            if not records:
+                return func(*args, **kwargs)
+            # Only the outermost call counts (e.g. value_counts() calling rollup())
+            outer = [record for record in records if not record.depth[name]]
+            for record in records:
+                record.depth[name] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                for record in records:
+                    record.depth[name] -= 1
+                for record in outer:
+                    record.phases[name] += elapsed
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def _track_figure(name):
+    record = _Record()
+    records = _records()
+    records.append(record)
+    try:
+        yield
+    finally:
+        records.remove(record)
+        FIGURE_SECONDS.observe(record.finish(), name)
+        for phase_name, seconds in record.phases.items():
+            FIGURE_PHASE_SECONDS.observe(seconds, name, phase_name)
+
+
+def track_figure(name):
+    """Context manager timing the build of figure `name`."""
+    return _track_figure(name) if ENABLED else contextlib.nullcontext()
+
+
+def _output_label(body, known):
+    # Pattern-matching outputs are labelled with their concrete id, so every
+    # lazy figure gets its own series. The body comes from the client: labels
+    # not in known() all go into one 'other' series, so made up ids can't add
+    # series without end
+    outputs = body.get('outputs')
+    if isinstance(outputs, dict) and isinstance(outputs.get('id'), dict):
+        label = f"{json.dumps(outputs['id'], sort_keys=True, separators=(',', ':'))}.{outputs.get('property')}"
+    else:
+        label = body.get('output', '')
+    return label if known is None or label in known() else 'other'
+
+
+def render(figure_cache=None):
+    lines = []
+    for histogram in (CALLBACK_SECONDS, CALLBACK_PHASE_SECONDS, RESPONSE_BYTES, FIGURE_SECONDS, FIGURE_PHASE_SECONDS):
+        lines.extend(histogram.render())
+    if figure_cache is not None:
+        stats = figure_cache.stats()
+        lines += ['# HELP sales_figure_cache_requests_total Figure cache lookups per callback.',
+                  '# TYPE sales_figure_cache_requests_total counter']
+        for name, counts in stats['per_callback'].items():
+            for result in ('hits', 'misses'):
+                lines.append(f'sales_figure_cache_requests_total{_labels(("callback", "result"), (name, result))} '
+                             f'{counts[result]}')
+        lines += ['# HELP sales_figure_cache_hit_ratio Share of figure cache lookups that were hits.',
+                  '# TYPE sales_figure_cache_hit_ratio gauge',
+                  f'sales_figure_cache_hit_ratio {stats["hit_ratio"]}',
+                  '# HELP sales_figure_cache_entries Figures held in the figure cache.',
+                  '# TYPE sales_figure_cache_entries gauge',
+                  f'sales_figure_cache_entries {stats["size"]}',
+                  '# HELP sales_figure_cache_evictions_total Figures evicted from the figure cache.',
+                  '# TYPE sales_figure_cache_evictions_total counter',
+                  f'sales_figure_cache_evictions_total {stats["evictions"]}']
+    return '\n'.join(lines) + '\n'
+
+
+def install(server, figure_cache=None, path='/metrics', outputs=None):
+    """Time the Dash callback requests of `server` and serve the metrics at `path`.
+
+    Call it before anything else registers after_request hooks (e.g.
+    payload.compress_responses), so response sizes are measured as sent.
+    `outputs()` returns the output labels that get their own series.
+    """
+    @server.route(path)
+    def metrics():
+        return Response(render(figure_cache), mimetype='text/plain; version=0.0.4')
+
+    if not ENABLED:
+        return
+
+    @server.before_request
+    def start_callback():
+        if request.path.endswith('/_dash-update-component'):
+            _records().append(_Record())
+
+    @server.after_request
+    def finish_callback(response):
+        if not request.path.endswith('/_dash-update-component'):
+            return response
+        records = _records()
+        if records:
+            record = records.pop()
+            output = _output_label(request.get_json(silent=True) or {}, outputs)
+            CALLBACK_SECONDS.observe(record.finish(), output)
+            for phase_name, seconds in record.phases.items():
+                CALLBACK_PHASE_SECONDS.observe(seconds, output, phase_name)
+            if not response.is_streamed:
+                RESPONSE_BYTES.observe(response.calculate_content_length() or 0, output)
+        return response
+
+    @server.teardown_request
+    def drop_callback(error=None):
+        # after_request doesn't run when the request failed
+        if getattr(_local, 'records', None):
+            _local.records.clear()
@@ -0,0 +1,199 @@
+"""The cleaned sales data laid out on disk by Region and Category.
+
+    python partitions.py cleanSalesData.csv .sales_partitions
+
+Every Region/Category pair gets its own directory, holding one part per CSV
+chunk in the columnar format of data_cache (one memory-mapped .npy per
+column). partitions.json lists every part with its row count, the min/max
+of each measure and the distinct values of each dimension, so a query
+filtered on a region, category, state... skips the parts that can't match
+without opening them, and only maps the columns it asks for. Each part also
+gets the quantile sketches of its rows (sketches.py), merged when opened.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from cleaning import RowDeduplicator
+from data_cache import read_columns, source_fingerprint, write_columns
+from schema import SCHEMA_ID, apply_schema
+from sketches import SketchSet
+from validation import RULES_ID, log_report, merge_reports, validate, write_quarantine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_BY = ('Region', 'Category')
+INDEX = 'partitions.json'
+QUARANTINE = 'quarantine.csv'
+SKETCHES = 'sketches.json'
+
+# Dimensions with more distinct values per part than this don't get a value
+# list in the index (and are never used for pruning)
+MAX_INDEXED_VALUES = 1000
+
+
+def _part_stats(part):
+    stats = {'rows': len(part), 'min': {}, 'max': {}, 'values': {}}
+    for name in part.columns:
+        column = part[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            values = column.cat.categories
+            if len(values) <= MAX_INDEXED_VALUES:
+                stats['values'][name] = sorted(values.tolist())
+        elif len(column):
+            stats['min'][name] = column.min().item()
+            stats['max'][name] = column.max().item()
+    return stats
+
+
+def write_partitions(source, target_dir, fingerprint=None, chunksize=1_000_000, by=PARTITION_BY):
+    """Validate the cleaned CSV `source` chunk by chunk and write it partitioned into target_dir."""
+    os.makedirs(target_dir)
+    parts, report = [], None
+    dedup = RowDeduplicator()
+    quarantine = os.path.join(target_dir, QUARANTINE)
+    for chunk_no, chunk in enumerate(pd.read_csv(source, chunksize=chunksize)):
+        # Duplicates are checked across chunks here, not by validate()
+        unique = dedup.unique_rows(chunk)
+        valid, rejected, chunk_report = validate(unique, check_duplicates=False)
+        duplicates = chunk.loc[chunk.index.difference(unique.index)].assign(failed_checks='duplicate')
+        chunk_report['failures']['duplicate'] = len(duplicates)
+        chunk_report['rows'] += len(duplicates)
+        chunk_report['quarantined_rows'] += len(duplicates)
+        report = merge_reports(report, chunk_report)
+        rejected = pd.concat([rejected, duplicates])
+        if len(rejected):
+            write_quarantine(rejected, quarantine, append=True)
+
+        typed, _ = apply_schema(valid)
+        for keys, part in typed.groupby(list(by), observed=True, sort=True):
+            part = part.reset_index(drop=True)
+            for name in part.columns:
+                if isinstance(part[name].dtype, pd.CategoricalDtype):
+                    part[name] = part[name].cat.remove_unused_categories()
+            path = os.path.join(*(f'{dim}={quote(str(key), safe="")}' for dim, key in zip(by, keys)),
+                                f'part-{chunk_no:05d}')
+            write_columns(part, os.path.join(target_dir, path), fingerprint)
+            with open(os.path.join(target_dir, path, SKETCHES), 'w') as f:
+                json.dump(SketchSet.from_frame(part).to_dict(), f)
+            parts.append({'path': path, 'keys': dict(zip(by, keys)), **_part_stats(part)})
+
+    with open(os.path.join(target_dir, INDEX), 'w') as f:
+        json.dump({'by': list(by), 'source': fingerprint, 'validation': report, 'parts': parts}, f)
+    return report
+
+
+class PartitionedDataset:
+    """Reads a directory written by write_partitions, one part at a time."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX)) as f:
+            index = json.load(f)
+        self.by = index['by']
+        self.parts = index['parts']
+        self.validation = index['validation']
+        self.version = os.path.basename(os.path.normpath(directory))
+        self.n_rows = sum(part['rows'] for part in self.parts)
+
+    def _values(self, part, dim):
+        # Distinct values of dim in part, or None when the index doesn't know them
+        if dim in part['keys']:
+            return {part['keys'][dim]}
+        values = part['values'].get(dim)
+        return None if values is None else set(values)
+
+    def prune(self, where=None):
+        """(part, dims still to filter row by row) for every part that can match `where`."""
+        where = {dim: set(values) for dim, values in (where or {}).items() if values}
+        for part in self.parts:
+            row_filter = []
+            for dim, wanted in where.items():
+                values = self._values(part, dim)
+                if values is not None and not values & wanted:
+                    break
+                if values is None or not values <= wanted:
+                    row_filter.append(dim)
+            else:
+                yield part, row_filter
+
+    def scan(self, columns, where=None):
+        """DataFrames of `columns` for the rows matching `where`, one per part left after pruning."""
+        where = where or {}
+        for part, row_filter in self.prune(where):
+            df = read_columns(os.path.join(self.directory, part['path']), columns=set(columns) | set(row_filter))
+            if row_filter:
+                mask = np.ones(len(df), dtype=bool)
+                for dim in row_filter:
+                    mask &= df[dim].isin(where[dim]).to_numpy()
+                df = df[mask]
+            yield part, df[list(columns)]
+
+    def sketches(self, where=None):
+        """The quantile sketches of the parts `where` can match, merged."""
+        sketches = []
+        for part, _ in self.prune(where):
+            path = os.path.join(self.directory, part['path'])
+            if os.path.exists(os.path.join(path, SKETCHES)):
+                with open(os.path.join(path, SKETCHES)) as f:
+                    sketches.append(SketchSet.from_dict(json.load(f)))
+            else:  # written before parts had sketches
+                sketches.append(SketchSet.from_frame(read_columns(path)))
+        return SketchSet().merge(*sketches)
+
+    def stats_range(self, column, where=None):
+        """(min, max) of a numeric column over the parts matching `where`, from the index only."""
+        lows, highs = [], []
+        for part, _ in self.prune(where):
+            if column in part['min']:
+                lows.append(part['min'][column])
+                highs.append(part['max'][column])
+        return (min(lows), max(highs)) if lows else (None, None)
+
+    def needs_row_filter(self, where):
+        # True when some matching part has rows that don't match `where`
+        return any(row_filter for _, row_filter in self.prune(where))
+
+
+def load_partitions(path, partitions_dir, chunksize=1_000_000):
+    """Open the partitioned copy of the cleaned CSV at path, writing it first if needed."""
+    os.makedirs(partitions_dir, exist_ok=True)
+    fingerprint = source_fingerprint(path, partitions_dir)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    target = os.path.join(partitions_dir, f"{stem}-{fingerprint['sha1'][:16]}-{SCHEMA_ID}-{RULES_ID}")
+
+    if not os.path.exists(os.path.join(target, INDEX)):
+        # Same dance as load_sales_data: build privately, rename into place
+        tmp_path = tempfile.mkdtemp(dir=partitions_dir, prefix=f'{stem}-building-')
+        try:
+            write_partitions(path, os.path.join(tmp_path, 'parts'), fingerprint, chunksize=chunksize)
+            try:
+                os.rename(os.path.join(tmp_path, 'parts'), target)
+            except OSError:
+                if not os.path.exists(os.path.join(target, INDEX)):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    dataset = PartitionedDataset(target)
+    logger.info('Opened %s: %s rows in %d parts', target, f'{dataset.n_rows:,}', len(dataset.parts))
+    if dataset.validation:
+        log_report(target, dataset.validation)
+    return dataset
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='cleaned CSV, e.g. cleanSalesData.csv')
+    parser.add_argument('partitions_dir', help='directory the partitioned copies are kept in')
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help='rows per chunk (default 1000000)')
+    args = parser.parse_args()
+    load_partitions(args.source, args.partitions_dir, chunksize=args.chunksize)
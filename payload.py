@@ -0,0 +1,132 @@
+import base64
+import gzip
+import logging
+
+import numpy as np
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Arrays shorter than this stay plain JSON lists, the typed array wrapper isn't worth it
+MIN_TYPED_ARRAY = 8
+
+# Smallest first; plotly.js reads all of these from base64 ("bdata")
+INT_DTYPES = ['i1', 'u1', 'i2', 'u2', 'i4', 'u4']
+
+
+def _numeric_array(value):
+    if isinstance(value, dict) and 'bdata' in value:
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        if 'shape' in value:
+            array = array.reshape([int(n) for n in str(value['shape']).split(',')])
+        return array
+    if not isinstance(value, list) or len(value) < MIN_TYPED_ARRAY:
+        return None
+    if not all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in value):
+        if not all(isinstance(row, list) for row in value):
+            return None
+        # 2d, e.g. a heatmap's z; None is a gap
+        try:
+            array = np.array(value, dtype='float64')
+        except (TypeError, ValueError):
+            return None
+        return array if array.ndim == 2 else None
+    try:
+        return np.array(value)
+    except OverflowError:
+        return None
+
+
+def typed_array(array):
+    """Smallest lossless typed array for `array`, as Plotly's {dtype, bdata} JSON."""
+    if array.dtype.kind == 'f':
+        finite = np.isfinite(array)
+        if finite.all() and np.array_equal(array, np.round(array)):
+            if array.size == 0 or abs(array).max() < 2 ** 31:
+                array = array.astype('int64')
+        elif np.array_equal(array.astype('float32'), array, equal_nan=True):
+            array = array.astype('float32')
+        else:
+            array = array.astype('float64')
+    if array.dtype.kind in 'iu':
+        low, high = (array.min(), array.max()) if array.size else (0, 0)
+        for dtype in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                array = array.astype(dtype)
+                break
+        else:
+            return None
+    elif array.dtype.kind != 'f':
+        return None
+
+    encoded = {'dtype': array.dtype.str[1:], 'bdata': base64.b64encode(np.ascontiguousarray(array)).decode('ascii')}
+    if array.ndim > 1:
+        encoded['shape'] = ', '.join(str(n) for n in array.shape)
+    return encoded
+
+
+def _compact(value):
+    if isinstance(value, dict) and 'bdata' not in value:
+        return {key: _compact(item) for key, item in value.items()}
+    array = _numeric_array(value)
+    if array is None:
+        return value
+    encoded = typed_array(array)
+    return value if encoded is None else encoded
+
+
+def compact_figure(figure):
+    """Encode the numeric arrays of every trace of a figure dict as typed arrays.
+
+    Instead of full float64 decimal text, arrays are sent base64 encoded in
+    the smallest dtype that holds them exactly: whole numbers (like the sums
+    rounded with .round(0)) as int8..int32, floats as float32 when that loses
+    nothing, float64 otherwise. Layouts and non-figure values are left alone.
+    """
+    traces = figure.get('data') if isinstance(figure, dict) else None
+    if not isinstance(traces, list):
+        return figure
+    figure['data'] = [_compact(trace) if isinstance(trace, dict) else trace for trace in traces]
+    return figure
+
+
+def _compress(data, accept_encoding):
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br', brotli.compress(data, quality=5)
+    if 'gzip' in accept_encoding:
+        return 'gzip', gzip.compress(data, compresslevel=6)
+    return None, data
+
+
+def compress_responses(server, paths=('/_dash-update-component', '/_dash-layout', '/_dash-dependencies'),
+                       min_size=500):
+    """Compress the Dash JSON responses of `server` (gzip, or brotli when installed)."""
+    @server.after_request
+    def compress(response):
+        if (
+            not request.path.endswith(paths)
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+        ):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        encoding, compressed = _compress(data, request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(compressed))
+        response.vary.add('Accept-Encoding')
+        logger.debug('%s: %d -> %d bytes (%s)', request.path, len(data), len(compressed), encoding)
+        return response
+    return compress
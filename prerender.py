@@ -0,0 +1,137 @@
+"""The page's layout with its initial callback outputs already filled in.
+
+Normally a new session downloads the layout and then fires every callback
+once to fill in the charts. In prerender mode (settings.PRERENDER) the
+layout is served with those outputs in it, along with /_dash-dependencies
+marking every callback prevent_initial_call, so the page paints in one
+request. Until there is a snapshot both are served as usual and the
+callbacks fill in the page like without prerendering.
+
+The rendered layout is kept as a snapshot file named after the layout code
+and the data version. A restarted server serves the latest snapshot right
+away; if its data version is out of date it is rebuilt in the background
+and swapped in when done.
+"""
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from flask import Response, request
+
+logger = logging.getLogger(__name__)
+
+
+def layout_key(*parts):
+    # Hash of whatever the rendered page depends on besides the data (layout,
+    # code, settings): snapshots with another key are never served
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:12]
+
+
+class LayoutSnapshot:
+    """Renders, stores and serves the prerendered layout.
+
+    `render()` returns (version, layout JSON) for the current data, or None
+    if the data changed while rendering. `version()` is the current data
+    version, compared to the snapshot's on every request. `dependencies()`
+    returns the /_dash-dependencies JSON to serve with a snapshot, with no
+    callback firing on load.
+    """
+
+    def __init__(self, directory, key, render, version, dependencies):
+        self.directory = directory
+        self.prefix = f'layout-{key}-'
+        self.render = render
+        self.version = version
+        self.dependencies = dependencies
+        self.snapshot = None  # (version, layout JSON bytes)
+        self._building = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # A worker forked in the middle of a rebuild must not inherit the held lock
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._building = threading.Lock()
+
+    def _path(self, version):
+        return os.path.join(self.directory, f'{self.prefix}{version}.json')
+
+    def load(self):
+        """Load the newest snapshot of this layout on disk; True if there was one."""
+        paths = glob.glob(os.path.join(self.directory, glob.escape(self.prefix) + '*.json'))
+        for path in sorted(paths, key=os.path.getmtime, reverse=True):
+            try:
+                with open(path, 'rb') as f:
+                    layout = f.read()
+            except OSError:
+                continue
+            self.snapshot = (os.path.basename(path)[len(self.prefix):-len('.json')], layout)
+            logger.info('Serving the layout snapshot %s', path)
+            return True
+        return False
+
+    def is_current(self):
+        return self.snapshot is not None and self.snapshot[0] == self.version()
+
+    def rebuild(self):
+        """Render and save a snapshot for the current data (skipped if one is already being built)."""
+        if not self._building.acquire(blocking=False):
+            return
+        try:
+            rendered = self.render()
+            if rendered is None:
+                return
+            version, layout = rendered
+            layout = layout.encode()
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(layout)
+                os.replace(tmp, self._path(version))
+            except BaseException:
+                os.remove(tmp)
+                raise
+            self.snapshot = (version, layout)
+            # Older snapshots of this layout are never served again
+            for path in glob.glob(os.path.join(self.directory, glob.escape(self.prefix) + '*.json')):
+                if path != self._path(version):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            logger.info('Saved the layout snapshot for %s: %d bytes', version, len(layout))
+        finally:
+            self._building.release()
+
+    def rebuild_in_background(self):
+        thread = threading.Thread(target=self._rebuild_logged, name='layout-snapshot', daemon=True)
+        thread.start()
+        return thread
+
+    def _rebuild_logged(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Rebuilding the layout snapshot failed')
+
+    def install(self, server):
+        """Answer the layout and dependencies requests of `server` from the snapshot, once there is one."""
+        @server.before_request
+        def serve_snapshot():
+            if self.snapshot is None:
+                return None
+            if request.path.endswith('/_dash-dependencies'):
+                return Response(self.dependencies(), mimetype='application/json')
+            if not request.path.endswith('/_dash-layout'):
+                return None
+            if not self.is_current() and not self._building.locked():
+                # Serve the old one meanwhile
+                self.rebuild_in_background()
+            return Response(self.snapshot[1], mimetype='application/json')
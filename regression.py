@@ -0,0 +1,106 @@
+"""Least squares lines kept as running sums instead of scipy.stats.linregress.
+
+A RunningRegression only holds n, Σx, Σy, Σxy, Σx² and Σy², so points can
+be added, removed or moved in O(1) and two fits can be merged. StateTrend
+uses it for the stores vs sales trend: one point per state (rows, sales),
+updated as rows are appended.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# Named like the fields of linregress's result (without the p-value, which
+# needs the t distribution and isn't shown anywhere)
+LinregressResult = namedtuple('LinregressResult', 'slope intercept rvalue stderr intercept_stderr')
+
+
+class RunningRegression:
+    __slots__ = ('n', 'sx', 'sy', 'sxy', 'sxx', 'syy')
+
+    def __init__(self, n=0, sx=0.0, sy=0.0, sxy=0.0, sxx=0.0, syy=0.0):
+        self.n, self.sx, self.sy, self.sxy, self.sxx, self.syy = n, sx, sy, sxy, sxx, syy
+
+    @classmethod
+    def from_points(cls, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        return cls(len(x), x.sum(), y.sum(), (x * y).sum(), (x * x).sum(), (y * y).sum())
+
+    def add(self, x, y, weight=1):
+        # weight=-1 takes a point back out
+        self.n += weight
+        self.sx += weight * x
+        self.sy += weight * y
+        self.sxy += weight * x * y
+        self.sxx += weight * x * x
+        self.syy += weight * y * y
+
+    def remove(self, x, y):
+        self.add(x, y, weight=-1)
+
+    def copy(self):
+        return RunningRegression(*(getattr(self, name) for name in self.__slots__))
+
+    def merge(self, other):
+        return RunningRegression(*(getattr(self, name) + getattr(other, name) for name in self.__slots__))
+
+    def result(self):
+        """slope, intercept, r and standard errors, as linregress computes them (NaN if undefined)."""
+        n = self.n
+        if n < 2:
+            return LinregressResult(*[math.nan] * 5)
+        mean_x, mean_y = self.sx / n, self.sy / n
+        ssxm = self.sxx / n - mean_x * mean_x
+        ssym = self.syy / n - mean_y * mean_y
+        ssxym = self.sxy / n - mean_x * mean_y
+        if ssxm <= 0:
+            return LinregressResult(*[math.nan] * 5)
+        slope = ssxym / ssxm
+        intercept = mean_y - slope * mean_x
+        if ssym <= 0:
+            r = 0.0
+        else:
+            # Rounding can push |r| a hair over 1
+            r = max(min(ssxym / math.sqrt(ssxm * ssym), 1.0), -1.0)
+        if n == 2:
+            return LinregressResult(slope, intercept, r, 0.0, 0.0)
+        stderr = math.sqrt(max((1 - r * r) * ssym / ssxm / (n - 2), 0.0))
+        intercept_stderr = stderr * math.sqrt(ssxm + mean_x * mean_x)
+        return LinregressResult(slope, intercept, r, stderr, intercept_stderr)
+
+
+class StateTrend:
+    """Total Sales vs number of rows per state, and the regression over those points.
+
+    add_rows() moves each touched state's point: its old contribution to the
+    sums is taken out and the new one added, O(1) per row.
+    """
+
+    def __init__(self, states, counts, sales):
+        self.points = {state: [int(count), float(total)] for state, count, total in zip(states, counts, sales)}
+        self.regression = RunningRegression.from_points(counts, sales)
+
+    @classmethod
+    def from_rollup(cls, rollup):
+        # rollup: one row per State with Sales and Count, e.g. cube.rollup(['State'], ['Sales'], count=True)
+        return cls(rollup['State'], rollup['Count'], rollup['Sales'])
+
+    def add_rows(self, states, sales):
+        batch = {}
+        for state, value in zip(states, sales):
+            point = batch.setdefault(state, [0, 0.0])
+            point[0] += 1
+            point[1] += float(value)
+        for state, (count, total) in batch.items():
+            point = self.points.get(state)
+            if point is None:
+                point = self.points[state] = [0, 0.0]
+            else:
+                self.regression.remove(*point)
+            point[0] += count
+            point[1] += total
+            self.regression.add(*point)
+
+    def result(self):
+        return self.regression.result()
@@ -0,0 +1,75 @@
+import glob
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(pattern):
+    """(path, size, mtime) of every file matching `pattern`, or None if there are none."""
+    signature = []
+    for path in sorted(glob.glob(pattern)) or [pattern]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        signature.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class FileWatcher:
+    """Calls `on_change()` on a background thread when the files at `pattern` change.
+
+    The files are polled every `interval` seconds (a stat per file, so this
+    works the same on every OS and network drives). A change is only acted on
+    once the files have stayed the same for `debounce` seconds, so a CSV that
+    is still being written or copied is not loaded half way. If `on_change`
+    fails the error is logged and the watcher waits for the next change.
+    """
+
+    def __init__(self, pattern, on_change, interval=5.0, debounce=2.0):
+        self.pattern = pattern
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='data-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _settled(self, signature):
+        # Wait until the files stop changing; None if stopped meanwhile
+        while not self._stop.wait(self.debounce):
+            current = file_signature(self.pattern)
+            if current == signature:
+                return signature
+            signature = current
+        return None
+
+    def _run(self):
+        last = file_signature(self.pattern)
+        while not self._stop.wait(self.interval):
+            signature = file_signature(self.pattern)
+            if signature is None or signature == last:
+                continue
+            signature = self._settled(signature)
+            if signature is None:
+                if self._stop.is_set():
+                    return
+                continue
+            last = signature
+            logger.info('%s changed, reloading', self.pattern)
+            try:
+                self.on_change()
+            except Exception:
+                logger.exception('Reloading %s failed, still serving the previous data', self.pattern)
@@ -0,0 +1,284 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Dimensions and measures the dashboard slices the data by
+DIMENSIONS = ['Region', 'State', 'City', 'Category', 'Sub-Category', 'Ship Mode', 'Type_of_customer']
+MEASURES = ['Sales', 'Profit', 'Quantity']
+
+
+def _code_dtype(n_values):
+    # Smallest unsigned integer type that can hold every code of a dimension
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_values <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def _sum_dtype(values):
+    # Integer measures keep integer sums, everything else is summed as float64
+    return np.int64 if np.asarray(values).dtype.kind in 'iu' else np.float64
+
+
+def _weighted_counts(keys, weights, length, dtype):
+    sums = np.bincount(keys, weights=weights, minlength=length)
+    return np.rint(sums).astype(dtype) if np.dtype(dtype).kind in 'iu' else sums
+
+
+class SalesCube:
+    """Sum/count of the measures for every combination of dimension values.
+
+    Each cell of the cube is one combination that actually occurs in the data.
+    Dimension values are stored as integer codes into a per-dimension
+    dictionary, measures as one flat array per measure, so rolling the cube up
+    to any subset of dimensions is a bincount over the cells instead of a
+    groupby over the raw rows.
+
+    Per-dimension marginals and grand totals are kept next to the cells, so
+    single-dimension rollups and totals don't touch the cells at all, and
+    append() can update everything by delta.
+    """
+
+    def __init__(self, dictionaries, codes, sums, counts):
+        self.lock = threading.RLock()
+        self.dictionaries = dictionaries  # dimension -> array of labels
+        self._code_of = {}  # dimension -> {label: code}, built on first use
+        self._cell_index = None  # tuple of codes -> cell, built on first append
+
+        # Cells live in buffers with spare room at the end so appends don't
+        # copy them every time; codes/sums/counts are views of the used part
+        self._n_cells = len(counts)
+        self._codes = dict(codes)
+        self._sums = dict(sums)
+        self._counts = counts
+        self._refresh_views()
+
+        self.marginals = {dim: self._marginal_of_cells(dim) for dim in self.dictionaries}
+        self.totals = {measure: values.sum() for measure, values in self.sums.items()}
+        self.totals['Count'] = int(self.counts.sum())
+
+    def _refresh_views(self):
+        n = self._n_cells
+        self.codes = {dim: codes[:n] for dim, codes in self._codes.items()}  # dimension -> code of each cell
+        self.sums = {measure: sums[:n] for measure, sums in self._sums.items()}  # measure -> sum of each cell
+        self.counts = self._counts[:n]  # number of rows in each cell
+
+    def _marginal_of_cells(self, dim):
+        # Totals per value of one dimension: {measure or 'Count': array indexed by code}
+        keys = self.codes[dim].astype(np.intp)
+        length = len(self.dictionaries[dim])
+        marginal = {
+            measure: _weighted_counts(keys, sums, length, sums.dtype)
+            for measure, sums in self.sums.items()
+        }
+        marginal['Count'] = _weighted_counts(keys, self.counts, length, np.int64)
+        return marginal
+
+    @property
+    def dimensions(self):
+        return list(self.dictionaries)
+
+    @property
+    def measures(self):
+        return list(self.sums)
+
+    @property
+    def n_cells(self):
+        return self._n_cells
+
+    def total(self, measure):
+        return self.totals[measure]
+
+    def total_count(self):
+        return self.totals['Count']
+
+    def code_of(self, dim):
+        if dim not in self._code_of:
+            self._code_of[dim] = {label: code for code, label in enumerate(self.dictionaries[dim])}
+        return self._code_of[dim]
+
+    def cell_mask(self, where):
+        """Boolean mask of the cells matching `where` ({dimension: value or list of values})."""
+        mask = np.ones(self.n_cells, dtype=bool)
+        for dim, values in where.items():
+            if isinstance(values, str):
+                values = [values]
+            codes = [self.code_of(dim)[v] for v in values if v in self.code_of(dim)]
+            mask &= np.isin(self.codes[dim], codes)
+        return mask
+
+    def _group_keys(self, dims):
+        # Single dimension: the codes already are the group keys
+        if len(dims) == 1:
+            dim = dims[0]
+            return self.codes[dim].astype(np.intp), len(self.dictionaries[dim]), None
+
+        shape = tuple(len(self.dictionaries[dim]) for dim in dims)
+        keys = np.ravel_multi_index([self.codes[dim].astype(np.intp) for dim in dims], shape)
+        keys, uniques = pd.factorize(keys, sort=True)
+        return keys, len(uniques), np.unravel_index(uniques, shape)
+
+    def _rollup_marginal(self, dim, measures, count):
+        marginal = self.marginals[dim]
+        present = marginal['Count'] > 0
+        result = {dim: self.dictionaries[dim][present]}
+        for measure in measures:
+            result[measure] = marginal[measure][present]
+        if count:
+            result['Count'] = marginal['Count'][present]
+        return pd.DataFrame(result)
+
+    def rollup(self, dims, measures=None, count=False, where=None):
+        """Aggregate the cube to `dims`, like df.groupby(dims)[measures].sum().
+
+        `where` restricts the rollup to some dimension values, see cell_mask().
+        """
+        if isinstance(dims, str):
+            dims = [dims]
+        measures = self.measures if measures is None else list(measures)
+
+        with self.lock:
+            if len(dims) == 1 and where is None:
+                result = self._rollup_marginal(dims[0], measures, count)
+            else:
+                cell_counts = self.counts if where is None else self.counts * self.cell_mask(where)
+                keys, n_groups, group_codes = self._group_keys(dims)
+                group_counts = np.bincount(keys, weights=cell_counts, minlength=n_groups).astype(np.int64)
+                present = group_counts > 0  # skip dictionary values with no rows
+
+                result = {}
+                for i, dim in enumerate(dims):
+                    labels = self.dictionaries[dim]
+                    result[dim] = labels[present] if group_codes is None else labels[group_codes[i][present]]
+                for measure in measures:
+                    cell_sums = self.sums[measure] if where is None else self.sums[measure] * (cell_counts > 0)
+                    sums = _weighted_counts(keys, cell_sums, n_groups, self.sums[measure].dtype)
+                    result[measure] = sums[present]
+                if count:
+                    result['Count'] = group_counts[present]
+                result = pd.DataFrame(result)
+        # Values added by append() go to the end of the dictionaries, so sort
+        # by label to keep groupby's ordering
+        return result.sort_values(by=dims, kind='stable').reset_index(drop=True)
+
+    def value_counts(self, dim):
+        """Number of rows per value of `dim`, most frequent first."""
+        counts = self.rollup([dim], measures=[], count=True)
+        return counts.sort_values(by='Count', ascending=False, kind='stable').reset_index(drop=True)
+
+    def _encode(self, dim, labels):
+        # Codes of `labels`, adding values never seen before to the dictionary
+        labels = np.asarray(labels, dtype=object)
+        codes = pd.Index(self.dictionaries[dim]).get_indexer(labels)
+        if (codes < 0).any():
+            new_labels = pd.unique(labels[codes < 0])
+            self.dictionaries[dim] = np.concatenate([self.dictionaries[dim], new_labels.astype(object)])
+            self._code_of.pop(dim, None)
+            n_values = len(self.dictionaries[dim])
+            if np.iinfo(self._codes[dim].dtype).max < n_values:
+                self._codes[dim] = self._codes[dim].astype(_code_dtype(n_values))
+            marginal = self.marginals[dim]
+            for name, values in marginal.items():
+                marginal[name] = np.concatenate([values, np.zeros(len(new_labels), values.dtype)])
+            codes = pd.Index(self.dictionaries[dim]).get_indexer(labels)
+        return codes
+
+    def _reserve(self, n_new):
+        # Grow the cell buffers geometrically, so appending n cells costs O(n) overall
+        needed = self._n_cells + n_new
+        if needed <= len(self._counts):
+            return
+        capacity = max(needed, 2 * len(self._counts), 64)
+
+        def grown(buffer):
+            bigger = np.zeros(capacity, dtype=buffer.dtype)
+            bigger[:self._n_cells] = buffer[:self._n_cells]
+            return bigger
+
+        self._codes = {dim: grown(codes) for dim, codes in self._codes.items()}
+        self._sums = {measure: grown(sums) for measure, sums in self._sums.items()}
+        self._counts = grown(self._counts)
+
+    def append(self, rows):
+        """Add new rows (with every dimension and measure column) to the cube.
+
+        Cells, marginals and totals are all updated by delta, so the cost is
+        proportional to the size of the batch, not to the size of the cube.
+        """
+        if len(rows) == 0:
+            return
+        with self.lock:
+            dims = self.dimensions
+            row_codes = [self._encode(dim, rows[dim]) for dim in dims]
+            measures = {measure: rows[measure].to_numpy() for measure in self.measures}
+
+            # Collapse the batch into its own cells first
+            shape = tuple(len(self.dictionaries[dim]) for dim in dims)
+            batch_cell_of_row, batch_keys = pd.factorize(np.ravel_multi_index(row_codes, shape))
+            n_batch_cells = len(batch_keys)
+            batch_cell_codes = np.unravel_index(batch_keys, shape)
+
+            # Then find (or make) the cube cell of every batch cell
+            if self._cell_index is None:
+                self._cell_index = {
+                    key: cell for cell, key in enumerate(zip(*(self.codes[dim].tolist() for dim in dims)))
+                }
+            cells = np.empty(n_batch_cells, dtype=np.intp)
+            new_cells = []
+            for i, key in enumerate(zip(*(codes.tolist() for codes in batch_cell_codes))):
+                cell = self._cell_index.get(key)
+                if cell is None:
+                    cell = self._n_cells + len(new_cells)
+                    self._cell_index[key] = cell
+                    new_cells.append(i)
+                cells[i] = cell
+
+            if new_cells:
+                self._reserve(len(new_cells))
+                for d, dim in enumerate(dims):
+                    self._codes[dim][cells[new_cells]] = batch_cell_codes[d][new_cells]
+                self._n_cells += len(new_cells)
+            for measure, values in measures.items():
+                buffer = self._sums[measure]
+                np.add.at(buffer, cells, _weighted_counts(batch_cell_of_row, values, n_batch_cells, buffer.dtype))
+            np.add.at(self._counts, cells, np.bincount(batch_cell_of_row, minlength=n_batch_cells))
+            self._refresh_views()
+
+            for d, dim in enumerate(dims):
+                marginal = self.marginals[dim]
+                length = len(self.dictionaries[dim])
+                for measure, values in measures.items():
+                    marginal[measure] += _weighted_counts(row_codes[d], values, length, marginal[measure].dtype)
+                marginal['Count'] += np.bincount(row_codes[d], minlength=length)
+            for measure, values in measures.items():
+                self.totals[measure] += values.sum()
+            self.totals['Count'] += len(rows)
+
+
+def build_cube(df, dimensions=DIMENSIONS, measures=MEASURES):
+    dictionaries, row_codes = {}, []
+    for dim in dimensions:
+        codes, labels = pd.factorize(df[dim], sort=True)
+        dictionaries[dim] = np.asarray(labels, dtype=object)
+        row_codes.append(codes)
+
+    # One integer key per row for its combination of dimension values
+    shape = tuple(len(dictionaries[dim]) for dim in dimensions)
+    row_keys = np.ravel_multi_index(row_codes, shape)
+    cell_of_row, cell_keys = pd.factorize(row_keys, sort=True)
+    n_cells = len(cell_keys)
+
+    cell_codes = np.unravel_index(cell_keys, shape)
+    codes = {
+        dim: cell_codes[i].astype(_code_dtype(len(dictionaries[dim])))
+        for i, dim in enumerate(dimensions)
+    }
+
+    sums = {}
+    for measure in measures:
+        values = df[measure].to_numpy()
+        sums[measure] = _weighted_counts(cell_of_row, values, n_cells, _sum_dtype(values))
+    counts = np.bincount(cell_of_row, minlength=n_cells).astype(np.int64)
+
+    return SalesCube(dictionaries, codes, sums, counts)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# Declared dtypes of the columns in cleanSalesData.csv.
+# Dimensions are low cardinality, so they are stored as categories (integer
+# codes + one shared dictionary). Measures are downcast when that is lossless.
+SCHEMA = {
+    'Ship Mode': 'category',
+    'Type_of_customer': 'category',
+    'City': 'category',
+    'State': 'category',
+    'Region': 'category',
+    'Category': 'category',
+    'Sub-Category': 'category',
+    'Sales': 'float64',
+    'Quantity': 'int16',
+    'Discount': 'float32',
+    'Profit': 'float64',
+}
+
+# Full US state names as they appear in the State column, with their postal
+# abbreviations (used by the choropleth map)
+STATE_ABBREV = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
+    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'Florida': 'FL', 'Georgia': 'GA',
+    'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS',
+    'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD', 'Massachusetts': 'MA',
+    'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS', 'Missouri': 'MO', 'Montana': 'MT',
+    'Nebraska': 'NE', 'Nevada': 'NV', 'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM',
+    'New York': 'NY', 'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK',
+    'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC', 'South Dakota': 'SD',
+    'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT', 'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA',
+    'West Virginia': 'WV', 'Wisconsin': 'WI', 'Wyoming': 'WY', 'District of Columbia': 'DC',
+}
+
+# Changes whenever SCHEMA does, so caches written with an older schema are not reused
+SCHEMA_ID = hashlib.sha1(json.dumps(SCHEMA, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def downcast(values, dtype):
+    # Returns the downcast array, or None if it would change any value
+    dtype = np.dtype(dtype)
+    values = np.asarray(values)
+    if values.dtype.kind not in 'biuf':
+        return None  # strings or objects: nothing to downcast
+    if dtype.kind in 'iu':
+        if values.dtype.kind not in 'iu':
+            return None
+        info = np.iinfo(dtype)
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            return None
+        return values.astype(dtype)
+    cast = values.astype(dtype)
+    # float32 keeps ~7 significant digits, which is plenty for 2-decimal discounts
+    if not np.allclose(cast.astype(values.dtype), values, rtol=1e-7, atol=0, equal_nan=True):
+        return None
+    return cast
+
+
+def apply_schema(df, schema=SCHEMA):
+    """Cast df to the declared schema; returns (typed frame, memory report)."""
+    columns, report = {}, []
+    for name in df.columns:
+        series = df[name]
+        dtype = schema.get(name)
+        if dtype == 'category':
+            typed = series.astype('category')
+        elif dtype is not None:
+            cast = downcast(series.to_numpy(), dtype)
+            typed = series if cast is None else pd.Series(cast, index=series.index, name=name)
+        else:
+            typed = series
+        columns[name] = typed
+        report.append({
+            'column': name,
+            'dtype': str(typed.dtype),
+            'bytes_before': int(series.memory_usage(index=False, deep=True)),
+            'bytes_after': int(typed.memory_usage(index=False, deep=True)),
+        })
+    return pd.DataFrame(columns), report
+
+
+def format_memory_report(report):
+    lines = [f"{'column':<18}{'dtype':<10}{'before':>12}{'after':>12}{'saved':>8}"]
+    before = after = 0
+    for row in report:
+        before += row['bytes_before']
+        after += row['bytes_after']
+        saved = 1 - row['bytes_after'] / row['bytes_before'] if row['bytes_before'] else 0
+        lines.append(f"{row['column']:<18}{row['dtype']:<10}{row['bytes_before']:>12,}"
+                     f"{row['bytes_after']:>12,}{saved:>8.0%}")
+    saved = 1 - after / before if before else 0
+    lines.append(f"{'total':<28}{before:>12,}{after:>12,}{saved:>8.0%}")
+    return '\n'.join(lines)
@@ -0,0 +1,84 @@
+"""Production entry point for the dashboard.
+
+    python serve.py [--workers N] [--threads N] [--bind HOST:PORT]
+
+The data is loaded, aggregated and every static figure built once, in this
+process. Then gunicorn forks the workers, which share all of it copy-on-write
+(the columns themselves are memory-mapped from the cache, so they are shared
+through the page cache anyway). Each worker answers requests with a pool of
+threads, so one slow callback doesn't hold up everyone else. With a layout
+snapshot (settings.PRERENDER) none of that is done up front: the workers
+serve the snapshot at once and each warms up behind it.
+
+Readiness is at /readyz, liveness at /healthz. Every worker watches the data
+file and reloads it on its own when it changes (settings.RELOAD_INTERVAL).
+
+Rows sent to /api/ingest only reach the worker that received them, so with
+more than one worker ingestion should be left disabled.
+"""
+import argparse
+import gc
+import logging
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+def load_app():
+    import SuperSalesDashBoard as dashboard
+
+    dashboard.warm_up()
+    # Everything allocated so far lives as long as the process: keep it out of
+    # the garbage collector, whose bookkeeping writes would otherwise copy the
+    # shared pages into every worker
+    gc.freeze()
+    return dashboard
+
+
+def start_threads(dashboard):
+    dashboard.warm_in_background()
+    dashboard.watch_data()
+
+
+def serve(bind, workers, threads):
+    dashboard = load_app()
+    server = dashboard.app.server
+    if workers > 1 and settings.INGEST_TOKEN:
+        logger.warning('/api/ingest is enabled with %d workers: ingested rows only reach one of them', workers)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:  # gunicorn doesn't run on Windows
+        logger.warning('gunicorn is not installed, serving with one process and %d threads', threads)
+        start_threads(dashboard)
+        host, _, port = bind.rpartition(':')
+        server.run(host=host or '0.0.0.0', port=int(port), threaded=True)
+        return
+
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            # Threads don't survive the fork: start each worker's own in it
+            self.cfg.set('post_fork', lambda arbiter, worker: start_threads(dashboard))
+
+        def load(self):
+            return server
+
+    # The app is already loaded here, so forked workers start serving at once
+    DashboardApplication().run()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bind', default=settings.BIND, help=f'address to listen on (default {settings.BIND})')
+    parser.add_argument('--workers', type=int, default=settings.WORKERS,
+                        help=f'worker processes (default {settings.WORKERS})')
+    parser.add_argument('--threads', type=int, default=settings.THREADS,
+                        help=f'threads per worker (default {settings.THREADS})')
+    args = parser.parse_args()
+    serve(args.bind, args.workers, args.threads)
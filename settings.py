@@ -0,0 +1,62 @@
+import os
+
+# Paths can be overridden with environment variables when deploying the dashboard
+DATA_PATH = os.environ.get('SALES_DATA_PATH', r"D:\Projects\Dashboard\SuperSalesStore\cleanSalesData.csv")
+
+# Columnar copies of DATA_PATH are kept here so the CSV is only parsed once
+CACHE_DIR = os.environ.get('SALES_CACHE_DIR', os.path.join(os.path.dirname(DATA_PATH), '.sales_cache'))
+
+# Number of callback figures kept in the in-memory LRU figure cache
+FIGURE_CACHE_SIZE = int(os.environ.get('SALES_FIGURE_CACHE_SIZE', '128'))
+
+# How the Discount scatter charts are drawn: 'density' bins every row into a
+# DENSITY_BINS x DENSITY_BINS heatmap, 'points' draws at most
+# SCATTER_POINT_BUDGET sampled rows with WebGL
+SCATTER_MODE = os.environ.get('SALES_SCATTER_MODE', 'density')
+DENSITY_BINS = int(os.environ.get('SALES_DENSITY_BINS', '40'))
+SCATTER_POINT_BUDGET = int(os.environ.get('SALES_SCATTER_POINT_BUDGET', '20000'))
+
+# Bearer token required by POST /api/ingest; ingestion is disabled when empty
+INGEST_TOKEN = os.environ.get('SALES_INGEST_TOKEN', '')
+
+# Production server (serve.py): address, number of worker processes and
+# threads per worker
+BIND = os.environ.get('SALES_BIND', '0.0.0.0:8050')
+WORKERS = int(os.environ.get('SALES_WORKERS', str(min(os.cpu_count() or 1, 8))))
+THREADS = int(os.environ.get('SALES_THREADS', '4'))
+
+# Where the top/bottom 10 states and the metric/level charts are drawn:
+# 'server' runs a callback per change, 'clientside' sends their aggregates to
+# the browser once (per cross-filter selection) and redraws them there
+CALLBACK_MODE = os.environ.get('SALES_CALLBACK_MODE', 'server')
+
+# gzip (or brotli, when installed) the Dash layout and callback responses;
+# turn off when a proxy in front already compresses them
+COMPRESS_RESPONSES = os.environ.get('SALES_COMPRESS_RESPONSES', '1') == '1'
+
+# How many figures warm_up() builds at once, and whether in threads or in
+# forked processes ('process', Linux/macOS; not with the duckdb backend,
+# whose connection can't be shared with a forked child)
+BUILD_WORKERS = int(os.environ.get('SALES_BUILD_WORKERS', str(min(os.cpu_count() or 1, 8))))
+BUILD_POOL = os.environ.get('SALES_BUILD_POOL', 'thread')
+
+# Where the charts' aggregations run: 'pandas' (in memory, from DATA_PATH),
+# 'duckdb' (SQL over DUCKDB_SOURCE, a Parquet/CSV file or glob, out-of-core)
+# or 'partitioned' (DATA_PATH split by Region/Category into PARTITIONS_DIR,
+# read part by part)
+BACKEND = os.environ.get('SALES_BACKEND', 'pandas')
+DUCKDB_SOURCE = os.environ.get('SALES_DUCKDB_SOURCE', DATA_PATH)
+PARTITIONS_DIR = os.environ.get('SALES_PARTITIONS_DIR', os.path.join(os.path.dirname(DATA_PATH), '.sales_partitions'))
+
+# Serve the page with the default charts already in it (see prerender.py),
+# from a snapshot kept in SNAPSHOT_DIR across restarts
+PRERENDER = os.environ.get('SALES_PRERENDER', '0') == '1'
+SNAPSHOT_DIR = os.environ.get('SALES_SNAPSHOT_DIR', os.path.join(os.path.dirname(DATA_PATH), '.sales_snapshots'))
+
+# Seconds between checks of the data file for changes (0 turns hot reload
+# off), and how long it must stay unchanged before it is loaded
+RELOAD_INTERVAL = float(os.environ.get('SALES_RELOAD_INTERVAL', '5'))
+RELOAD_DEBOUNCE = float(os.environ.get('SALES_RELOAD_DEBOUNCE', '2'))
+
+# Time callbacks and figure builds and serve the numbers at /metrics
+METRICS_ENABLED = os.environ.get('SALES_METRICS_ENABLED', '1') == '1'
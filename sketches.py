@@ -0,0 +1,191 @@
+"""Quantile sketches of the measures, per dimension value.
+
+A TDigest summarizes any number of values in well under `compression`
+centroids (mean, weight), denser towards both tails, and answers quantiles and
+histograms from those alone. Two digests merge into the digest of the
+union, so sketches built per partition, per chunk or per worker can be
+combined without going back to the rows.
+
+SketchSet keeps one digest per measure for the whole data and for every
+value of each sketched dimension, e.g. ('Sales', 'Region', 'West').
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+SKETCH_DIMENSIONS = ('Category', 'Sub-Category', 'Region', 'State')
+SKETCH_MEASURES = ('Sales', 'Profit', 'Discount')
+
+
+def _compress(means, weights, compression):
+    # Merge neighbouring centroids so that none spans more than one unit of
+    # the k2 scale function (log odds of q, scaled by compression): centroids
+    # stay small near q=0 and q=1, where the extreme quantiles need them
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+    total = weights.sum()
+    q_left = np.clip((np.cumsum(weights) - weights) / total, 1e-15, 1 - 1e-15)
+    scale = compression / (4 * math.log(max(total / compression, 1.0)) + 24)
+    k = scale * np.log(q_left / (1 - q_left))
+    groups = np.floor(k - k[0]).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+
+class TDigest:
+    __slots__ = ('compression', '_centroids', 'min', 'max')
+
+    def __init__(self, compression=300):
+        self.compression = compression
+        # (means, weights) sorted by mean; replaced as a whole, so readers on
+        # other threads never see the two out of step
+        self._centroids = (np.empty(0), np.empty(0))
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return float(self._centroids[1].sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        means, weights = self._centroids
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._centroids = _compress(np.concatenate([means, values]),
+                                    np.concatenate([weights, np.ones(len(values))]), self.compression)
+        return self
+
+    def merge(self, *others):
+        """A new digest of this one's values and those of `others`."""
+        digests = (self,) + others
+        merged = TDigest(self.compression)
+        means = np.concatenate([digest._centroids[0] for digest in digests])
+        if len(means):
+            weights = np.concatenate([digest._centroids[1] for digest in digests])
+            merged._centroids = _compress(means, weights, self.compression)
+            merged.min = min(digest.min for digest in digests)
+            merged.max = max(digest.max for digest in digests)
+        return merged
+
+    def _curve(self):
+        # Cumulative weight at each centroid's center, pinned to min/max at the ends
+        means, weights = self._centroids
+        centers = np.cumsum(weights) - weights / 2
+        return np.r_[self.min, means, self.max], np.r_[0.0, centers, weights.sum()]
+
+    def quantile(self, q):
+        """Value(s) at quantile(s) q in [0, 1]; NaN for an empty digest."""
+        if not len(self._centroids[0]):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+        values, ranks = self._curve()
+        return np.interp(np.asarray(q, dtype=np.float64) * ranks[-1], ranks, values)
+
+    def cdf(self, x):
+        """Share of the values <= x."""
+        if not len(self._centroids[0]):
+            return np.zeros(np.shape(x)) if np.ndim(x) else 0.0
+        values, ranks = self._curve()
+        return np.interp(x, values, ranks, left=0.0, right=ranks[-1]) / ranks[-1]
+
+    def histogram(self, edges):
+        """Estimated number of values between each pair of consecutive edges."""
+        return np.diff(self.cdf(np.asarray(edges, dtype=np.float64))) * self.count
+
+    def to_dict(self):
+        means, weights = self._centroids
+        return {'compression': self.compression, 'min': self.min, 'max': self.max,
+                'means': means.tolist(), 'weights': weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(data['compression'])
+        digest._centroids = (np.array(data['means'], dtype=np.float64), np.array(data['weights'], dtype=np.float64))
+        digest.min, digest.max = data['min'], data['max']
+        return digest
+
+
+class SketchSet:
+    """One TDigest per measure, overall and per value of each sketched dimension."""
+
+    def __init__(self, dimensions=SKETCH_DIMENSIONS, measures=SKETCH_MEASURES, compression=300):
+        self.dimensions = tuple(dimensions)
+        self.measures = tuple(measures)
+        self.compression = compression
+        self.digests = {}  # (measure, dimension or None, value or None) -> TDigest
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        return cls(**kwargs).update(df)
+
+    def _digest(self, key):
+        digest = self.digests.get(key)
+        if digest is None:
+            digest = self.digests[key] = TDigest(self.compression)
+        return digest
+
+    def update(self, df):
+        """Add the rows of df (it needs the sketched dimensions and measures)."""
+        if not len(df):
+            return self
+        groups = {}
+        for dim in self.dimensions:
+            # Rows sorted by value, split where the value changes
+            codes, labels = pd.factorize(df[dim], sort=True)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            groups[dim] = (labels, order, bounds)
+        for measure in self.measures:
+            values = df[measure].to_numpy(dtype=np.float64)
+            self._digest((measure, None, None)).update(values)
+            for dim, (labels, order, bounds) in groups.items():
+                for i, label in enumerate(labels):
+                    self._digest((measure, dim, label)).update(values[order[bounds[i]:bounds[i + 1]]])
+        return self
+
+    def merge(self, *others):
+        """A new SketchSet of the data behind this one and `others`, e.g. one per partition."""
+        merged = SketchSet(self.dimensions, self.measures, self.compression)
+        keys = set(self.digests).union(*(other.digests for other in others))
+        for key in keys:
+            digests = [sketches.digests[key] for sketches in (self,) + others if key in sketches.digests]
+            merged.digests[key] = digests[0].merge(*digests[1:])
+        return merged
+
+    def digest(self, measure, dim=None, values=None):
+        """Digest of `measure` over the rows where dim is one of `values` (all rows if no dim)."""
+        if dim is None:
+            return self.digests.get((measure, None, None), TDigest(self.compression))
+        digests = [self.digests[(measure, dim, value)] for value in values if (measure, dim, value) in self.digests]
+        if not digests:
+            return TDigest(self.compression)
+        return digests[0] if len(digests) == 1 else digests[0].merge(*digests[1:])
+
+    def values(self, dim):
+        # Values of dim that have a digest, sorted
+        return sorted({key[2] for key in self.digests if key[1] == dim})
+
+    def quantiles(self, measure, q, dim=None, values=None):
+        return self.digest(measure, dim, values).quantile(q)
+
+    def histogram(self, measure, edges, dim=None, values=None):
+        return self.digest(measure, dim, values).histogram(edges)
+
+    def to_dict(self):
+        return {'dimensions': list(self.dimensions), 'measures': list(self.measures),
+                'compression': self.compression,
+                'digests': [[measure, dim, value, digest.to_dict()]
+                            for (measure, dim, value), digest in self.digests.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketches = cls(data['dimensions'], data['measures'], data['compression'])
+        for measure, dim, value, digest in data['digests']:
+            sketches.digests[(measure, dim, value)] = TDigest.from_dict(digest)
+        return sketches
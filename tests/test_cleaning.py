@@ -0,0 +1,31 @@
+"""clean_csv() quarantines raw rows with unusable measures instead of failing."""
+import os
+import sys
+
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from cleaning import clean_csv
+
+
+def test_clean_csv_quarantines_bad_measures(tmp_path):
+    raw = pd.read_csv(os.path.join(REPO, 'SampleSuperstore.csv'), nrows=200, dtype=str)
+    raw.loc[3, 'Quantity'] = ''
+    raw.loc[5, 'Sales'] = 'abc'
+    raw.loc[9, 'Discount'] = '0.2x'
+    source, target = tmp_path / 'raw.csv', tmp_path / 'clean.csv'
+    raw.to_csv(source, index=False)
+
+    stats = clean_csv(str(source), str(target))
+
+    assert stats['quarantined'] == 3
+    assert stats['rows_written'] == 200 - 3 - stats['duplicates']
+    quarantine = pd.read_csv(tmp_path / 'clean.quarantine.csv')
+    assert quarantine['failed_checks'].tolist() == ['Quantity is empty', 'Sales not a number', 'Discount not a number']
+    clean = pd.read_csv(target)
+    assert len(clean) == stats['rows_written']
+    assert clean['Quantity'].dtype == 'int64'
+    assert clean['Sales'].dtype == clean['Discount'].dtype == clean['Profit'].dtype == 'float64'
+    assert (clean['Profit'] >= 0).all()
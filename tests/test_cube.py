@@ -0,0 +1,87 @@
+"""Appending batches to a SalesDataset keeps its cube equal to one built from all the rows."""
+import itertools
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from dataset import SalesDataset
+from sales_cube import DIMENSIONS, MEASURES, build_cube
+from schema import apply_schema
+
+ROLLUPS = [[dim] for dim in DIMENSIONS] + [['Region', 'State'], ['Category', 'Sub-Category'], ['Region', 'Ship Mode']]
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return pd.read_csv(os.path.join(REPO, 'cleanSalesData.csv'))
+
+
+def typed(df):
+    return apply_schema(df.reset_index(drop=True))[0]
+
+
+def assert_same_cube(cube, expected):
+    assert cube.total_count() == expected.total_count()
+    for measure in MEASURES:
+        assert cube.total(measure) == pytest.approx(expected.total(measure))
+    for dims in ROLLUPS:
+        got = cube.rollup(dims, list(MEASURES), count=True)
+        want = expected.rollup(dims, list(MEASURES), count=True)
+        # Labels first seen in a batch are numbered after the loaded ones, so compare by label
+        got = got.astype({dim: str for dim in dims}).sort_values(dims).reset_index(drop=True)
+        want = want.astype({dim: str for dim in dims}).sort_values(dims).reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, want, check_dtype=False, check_exact=False, rtol=1e-9)
+
+
+def test_append_in_batches_matches_build_cube(rows):
+    # Leave out whole states and sub-categories from the loaded rows, so the
+    # batches bring labels the cube hasn't seen
+    later = rows['State'].isin(['Texas', 'Vermont']) | (rows['Sub-Category'] == 'Copiers')
+    dataset = SalesDataset(typed(rows[~later]), version='test')
+
+    added = 0
+    batches = rows[later].sample(frac=1, random_state=0)
+    for start in range(0, len(batches), len(batches) // 4 + 1):
+        added += dataset.append(batches.iloc[start:start + len(batches) // 4 + 1])[0]
+
+    assert added == later.sum()
+    assert dataset.batches == 4
+    assert_same_cube(dataset.cube, build_cube(typed(pd.concat([rows[~later], rows[later]]))))
+
+
+def test_duplicate_rows_across_batches_are_added_once(rows):
+    loaded, first, second = rows.iloc[:6000], rows.iloc[6000:7000], rows.iloc[7000:8000]
+    dataset = SalesDataset(typed(loaded), version='test')
+
+    assert dataset.append(first)[0] == len(first)
+    # Everything again, already loaded rows, a row twice in the batch and 1000 new ones
+    batch = pd.concat([first, loaded.iloc[:500], second, second.iloc[:10]])
+    added, quarantined = dataset.append(batch)
+    # Only duplicates: nothing added, the version stays
+    version = dataset.version
+    assert dataset.append(pd.concat([first.iloc[:100], loaded.iloc[-100:]]))[0] == 0
+
+    assert added == len(second)
+    assert len(quarantined) == 0
+    assert dataset.version == version
+    assert len(dataset.rows) == 8000
+    assert_same_cube(dataset.cube, build_cube(typed(rows.iloc[:8000])))
+
+
+@pytest.mark.parametrize('dims', list(itertools.combinations(['Region', 'Category', 'Ship Mode'], 2)))
+def test_selection_rollups_after_append(rows, dims):
+    dataset = SalesDataset(typed(rows.iloc[:5000]), version='test')
+    dataset.append(rows.iloc[5000:])
+    where = {'Region': ['West', 'East'], 'Category': ['Technology']}
+
+    got = dataset.cube.rollup(list(dims), ['Sales'], count=True, where=where)
+    want = build_cube(typed(rows)).rollup(list(dims), ['Sales'], count=True, where=where)
+
+    pd.testing.assert_frame_equal(got.astype({dim: str for dim in dims}).reset_index(drop=True),
+                                  want.astype({dim: str for dim in dims}).reset_index(drop=True),
+                                  check_dtype=False, check_exact=False, rtol=1e-9)
@@ -0,0 +1,75 @@
+"""/api/ingest must keep rows that fail validation out of the aggregates."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+TOKEN = 'test-token'
+
+VALID = {
+    'Ship Mode': 'Standard Class', 'Segment': 'Consumer', 'Country': 'United States', 'City': 'Omaha',
+    'State': 'Nebraska', 'Postal Code': 68104, 'Region': 'Central', 'Category': 'Technology',
+    'Sub-Category': 'Phones', 'Sales': 123.45, 'Quantity': 3, 'Discount': 0.2, 'Profit': 12.5,
+}
+
+
+@pytest.fixture(scope='module')
+def dashboard():
+    # The dashboard loads its data on import, so the settings go in first
+    os.environ['SALES_DATA_PATH'] = os.path.join(REPO, 'cleanSalesData.csv')
+    os.environ['SALES_CACHE_DIR'] = tempfile.mkdtemp()
+    os.environ['SALES_INGEST_TOKEN'] = TOKEN
+    os.environ['SALES_BACKEND'] = 'pandas'
+    os.environ['SALES_PRERENDER'] = '0'
+    import SuperSalesDashBoard
+    return SuperSalesDashBoard
+
+
+def post(dashboard, rows):
+    client = dashboard.app.server.test_client()
+    return client.post('/api/ingest', json=rows, headers={'Authorization': f'Bearer {TOKEN}'})
+
+
+def test_invalid_rows_are_quarantined(dashboard):
+    cube = dashboard.dataset.cube
+    sales_before = cube.total('Sales')
+    rows_before = cube.rollup(['Region'], count=True)['Count'].sum()
+    invalid = [
+        {**VALID, 'Region': 'North'},
+        {**VALID, 'Sales': -5},
+        {**VALID, 'State': 'Atlantis'},
+        {**VALID, 'Discount': 3},
+        {**VALID, 'City': None},
+    ]
+
+    response = post(dashboard, invalid + [VALID])
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['added'] == 1
+    assert body['quarantined'] == len(invalid)
+    assert [row['row'] for row in body['rejected']] == list(range(len(invalid)))
+    assert body['rejected'][0]['failed_checks'] == 'Region not allowed'
+    assert body['rejected'][4]['failed_checks'] == 'City is empty'
+
+    cube = dashboard.dataset.cube
+    regions = cube.rollup(['Region'], count=True)
+    assert set(regions['Region']) == {'Central', 'East', 'South', 'West'}
+    assert regions['Count'].sum() == rows_before + 1
+    assert cube.total('Sales') == pytest.approx(sales_before + VALID['Sales'])
+    assert 'Atlantis' not in set(cube.rollup(['State'])['State'])
+
+
+def test_only_invalid_rows(dashboard):
+    version = dashboard.dataset.version
+
+    body = post(dashboard, [{**VALID, 'Region': 'North', 'Sales': 1.0}]).get_json()
+
+    assert body['added'] == 0
+    assert body['quarantined'] == 1
+    assert body['duplicates'] == 0
+    assert body['version'] == version
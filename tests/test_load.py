@@ -0,0 +1,60 @@
+"""Rows with unusable measures are quarantined when a file is loaded, never crash the load."""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from data_cache import QUARANTINE, load_sales_data
+from partitions import load_partitions
+from schema import SCHEMA
+
+
+@pytest.fixture
+def clean_csv(tmp_path):
+    # The first 200 rows of the cleaned data with one broken row written in
+    def write(**broken):
+        df = pd.read_csv(os.path.join(REPO, 'cleanSalesData.csv'), nrows=200, dtype=str)
+        for column, value in broken.items():
+            df.loc[7, column] = value
+        path = tmp_path / 'sales.csv'
+        df.to_csv(path, index=False)
+        return str(path)
+    return write
+
+
+def check_measures(df):
+    for column in ('Sales', 'Quantity', 'Discount', 'Profit'):
+        assert df[column].dtype == SCHEMA[column]
+
+
+@pytest.mark.parametrize('column, value, check', [
+    ('Sales', 'abc', 'Sales not a number'),
+    ('Quantity', '', 'Quantity is empty'),
+    ('Profit', 'twelve', 'Profit not a number'),
+    ('Quantity', '2.5', 'Quantity not a whole number'),
+])
+def test_load_sales_data_quarantines_bad_measures(clean_csv, tmp_path, column, value, check):
+    path = clean_csv(**{column: value})
+
+    df = load_sales_data(path, str(tmp_path / 'cache'))
+
+    assert len(df) == 199
+    check_measures(df)
+    quarantine = pd.read_csv(os.path.join(tmp_path / 'cache', df.attrs['version'], QUARANTINE))
+    assert quarantine['failed_checks'].tolist() == [check]
+
+
+@pytest.mark.parametrize('column, value', [('Sales', 'abc'), ('Quantity', '')])
+def test_load_partitions_quarantines_bad_measures(clean_csv, tmp_path, column, value):
+    path = clean_csv(**{column: value})
+
+    dataset = load_partitions(path, str(tmp_path / 'parts'))
+
+    assert dataset.n_rows == 199
+    assert dataset.validation['quarantined_rows'] == 1
+    for _, frame in dataset.scan(['Sales', 'Quantity', 'Discount', 'Profit']):
+        check_measures(frame)
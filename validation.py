@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import SCHEMA, STATE_ABBREV
+
+logger = logging.getLogger(__name__)
+
+# The checks CodeToCleanSalesData.ipynb did by eye (unique(), negatives,
+# duplicates, NaNs), declared once and run on every file that is loaded or
+# cleaned. Each one is a single vectorized pass over a column.
+ALLOWED_VALUES = {
+    'Region': {'Central', 'East', 'South', 'West'},
+    'Ship Mode': {'First Class', 'Same Day', 'Second Class', 'Standard Class'},
+    'Type_of_customer': {'Consumer', 'Corporate', 'Home Office'},
+    'State': set(STATE_ABBREV),
+}
+
+# Measures: every value has to parse as a number (a whole one for integer
+# columns); the valid rows come back converted
+NUMERIC = {column: dtype for column, dtype in SCHEMA.items() if dtype != 'category'}
+
+# Inclusive (min, max); None leaves that side open
+RANGES = {
+    'Discount': (0, 1),
+    'Quantity': (1, None),
+    'Sales': (0, None),
+}
+
+# Changes whenever the rules do, so files validated with older rules are validated again
+RULES_ID = hashlib.sha1(json.dumps(
+    [{column: sorted(values) for column, values in ALLOWED_VALUES.items()}, RANGES, NUMERIC], sort_keys=True,
+).encode()).hexdigest()[:8]
+
+
+def validate(df, check_duplicates=True):
+    """Check df against the declared rules.
+
+    Returns (valid rows, quarantined rows, report). The measures of the valid
+    rows are numbers (int64 or float64, see apply_schema() for the declared
+    dtypes), whatever they were read as. Quarantined rows get a
+    `failed_checks` column naming every check they failed; the report counts
+    the rows failing each check. Only a missing column raises (ValueError),
+    since then no row can be used.
+    """
+    missing = [column for column in SCHEMA if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    failures = {}
+    for column, is_null in df[list(SCHEMA)].isna().items():
+        failures[f'{column} is empty'] = is_null.to_numpy()
+    for column, allowed in ALLOWED_VALUES.items():
+        values = df[column]
+        failures[f'{column} not allowed'] = (~values.isin(allowed) & values.notna()).to_numpy()
+    numbers = {}
+    for column, dtype in NUMERIC.items():
+        values = numbers[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        failures[f'{column} not a number'] = (values.isna() & df[column].notna()).to_numpy()
+        if np.dtype(dtype).kind in 'iu':
+            failures[f'{column} not a whole number'] = (values.notna() & (values % 1 != 0)).to_numpy()
+    for column, (low, high) in RANGES.items():
+        values = numbers[column]
+        outside = np.zeros(len(df), dtype=bool)
+        if low is not None:
+            outside |= (values < low).to_numpy()
+        if high is not None:
+            outside |= (values > high).to_numpy()
+        failures[f'{column} out of range'] = outside
+    if check_duplicates:
+        failures['duplicate'] = df.duplicated().to_numpy()
+
+    bad = np.zeros(len(df), dtype=bool)
+    for mask in failures.values():
+        bad |= mask
+
+    quarantined = df[bad].copy()
+    reasons = np.full(len(quarantined), '', dtype=object)
+    for check, mask in failures.items():
+        failed = mask[bad]
+        reasons[failed] = reasons[failed] + np.where(reasons[failed] == '', '', '; ') + check
+    quarantined['failed_checks'] = reasons
+
+    report = {
+        'rows': len(df),
+        'valid_rows': int(len(df) - bad.sum()),
+        'quarantined_rows': int(bad.sum()),
+        'unexpected_columns': [column for column in df.columns if column not in SCHEMA],
+        'failures': {check: int(mask.sum()) for check, mask in failures.items()},
+    }
+    valid = df[~bad].reset_index(drop=True)
+    for column, values in numbers.items():
+        # No NaN left in these: empty and unparsable values were quarantined
+        values = values[~bad].to_numpy()
+        valid[column] = values.astype(np.int64) if np.dtype(NUMERIC[column]).kind in 'iu' else values
+    return valid, quarantined, report
+
+
+def merge_reports(total, report):
+    # Adds the counts of `report` (one chunk) to `total`
+    if total is None:
+        return {**report, 'failures': dict(report['failures'])}
+    for key in ('rows', 'valid_rows', 'quarantined_rows'):
+        total[key] += report[key]
+    for check, count in report['failures'].items():
+        total['failures'][check] = total['failures'].get(check, 0) + count
+    return total
+
+
+def log_report(source, report):
+    failed = {check: count for check, count in report['failures'].items() if count}
+    if report['quarantined_rows']:
+        logger.warning('%s: quarantined %s of %s rows (%s)', source, f"{report['quarantined_rows']:,}",
+                       f"{report['rows']:,}", ', '.join(f'{check}: {count:,}' for check, count in failed.items()))
+    else:
+        logger.info('%s: all %s rows passed validation', source, f"{report['rows']:,}")
+
+
+def write_quarantine(rows, path, append=False):
+    """Write quarantined rows to the CSV at path (appending without a header if asked)."""
+    header = not (append and os.path.exists(path))
+    rows.to_csv(path, mode='a' if append else 'w', header=header, index=False)